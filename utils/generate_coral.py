@@ -7,215 +7,375 @@ Inspired by orange/pink sea fan coral.
 
 import argparse
 import math
-import random
-from dataclasses import dataclass
-from typing import List, Tuple
-
-
-@dataclass
-class Vec3:
-    x: float
-    y: float
-    z: float
-
-    def __add__(self, other):
-        return Vec3(self.x + other.x, self.y + other.y, self.z + other.z)
-
-    def __mul__(self, scalar):
-        return Vec3(self.x * scalar, self.y * scalar, self.z * scalar)
-
-    def normalize(self):
-        length = math.sqrt(self.x**2 + self.y**2 + self.z**2)
-        if length > 0:
-            return Vec3(self.x / length, self.y / length, self.z / length)
-        return Vec3(0, 1, 0)
+from multiprocessing import Pool
+
+import numpy as np
+
+from jit import njit
+
+
+UP = np.array([0.0, 1.0, 0.0])
+RIGHT = np.array([1.0, 0.0, 0.0])
+
+RANDOM_BATCH = 1 << 16  # Uniform samples generated per refill
+
+# Tags keeping the per-main-branch and per-template random streams apart
+MAIN_BRANCH_STREAM = 0
+TEMPLATE_STREAM = 1
+
+
+def rotation_to(direction: np.ndarray) -> np.ndarray:
+    """Rotation matrix that turns +Y onto the unit vector direction."""
+    c = direction[1]
+    if c < -0.999999:
+        return np.diag([1.0, -1.0, -1.0])  # Half turn about X
+    v = np.cross(UP, direction)
+    vx = np.array([
+        [0.0, -v[2], v[1]],
+        [v[2], 0.0, -v[0]],
+        [-v[1], v[0], 0.0],
+    ])
+    return np.eye(3) + vx + vx @ vx / (1.0 + c)
+
+
+def normalize(v: np.ndarray) -> np.ndarray:
+    """Scale a 3-vector to unit length (straight up for a zero vector)."""
+    l2 = v.dot(v)
+    if l2 > 1e-12:
+        return v * (1.0 / math.sqrt(l2))
+    return UP.copy()
+
+
+@njit(cache=True)
+def _unit_cross(ax, ay, az, bx, by, bz):
+    """Return normalize(a x b) without building the intermediate cross product."""
+    cx = ay * bz - az * by
+    cy = az * bx - ax * bz
+    cz = ax * by - ay * bx
+    # One divide and three multiplies instead of three divides
+    l2 = cx * cx + cy * cy + cz * cz
+    if l2 > 1e-12:
+        inv = 1.0 / math.sqrt(l2)
+        return cx * inv, cy * inv, cz * inv
+    return 0.0, 1.0, 0.0
+
+
+@njit(cache=True)
+def _emit_cylinder(vertices, faces, n_verts, n_faces, start, end,
+                   radius_start, radius_end, ring_cos, ring_sin, ring_faces):
+    """
+    Write a tapered cylinder into the mesh buffers at n_verts/n_faces.
+    The buffers must have room for 2 * segments rows each.
+    Returns False (writing nothing) for a degenerate cylinder.
+    """
+    dx = end[0] - start[0]
+    dy = end[1] - start[1]
+    dz = end[2] - start[2]
+    length = math.sqrt(dx * dx + dy * dy + dz * dz)
+    if length < 0.001:
+        return False
+    inv = 1.0 / length
+    dx, dy, dz = dx * inv, dy * inv, dz * inv
+
+    # Find perpendicular vectors
+    if abs(dy) < 0.9:
+        ux, uy, uz = 0.0, 1.0, 0.0
+    else:
+        ux, uy, uz = 1.0, 0.0, 0.0
+
+    # Cross products to get perpendicular basis
+    p1x, p1y, p1z = _unit_cross(dx, dy, dz, ux, uy, uz)
+    p2x, p2y, p2z = _unit_cross(dx, dy, dz, p1x, p1y, p1z)
+
+    # Create vertices for cylinder rings
+    segments = len(ring_cos)
+    for i in range(segments):
+        ox = ring_cos[i] * p1x + ring_sin[i] * p2x
+        oy = ring_cos[i] * p1y + ring_sin[i] * p2y
+        oz = ring_cos[i] * p1z + ring_sin[i] * p2z
+        vertices[n_verts + i, 0] = start[0] + ox * radius_start
+        vertices[n_verts + i, 1] = start[1] + oy * radius_start
+        vertices[n_verts + i, 2] = start[2] + oz * radius_start
+        vertices[n_verts + segments + i, 0] = end[0] + ox * radius_end
+        vertices[n_verts + segments + i, 1] = end[1] + oy * radius_end
+        vertices[n_verts + segments + i, 2] = end[2] + oz * radius_end
+
+    # Create faces connecting the rings
+    for k in range(len(ring_faces)):
+        for c in range(3):
+            faces[n_faces + k, c] = ring_faces[k, c] + n_verts
+    return True
+
+
+def _format_rows(fmt: str, rows: np.ndarray) -> str:
+    """
+    Format every row of a 2D array with a printf-style line template.
+    One %-operation over the flattened values is several times faster than
+    np.savetxt, which formats row by row in Python.
+    """
+    return (fmt * len(rows)) % tuple(rows.ravel().tolist())
+
+
+def _grow_main_branch(task: tuple) -> tuple:
+    """Grow one main branch in its own generator; process pool entry point."""
+    seed, reuse_branches, index, start, direction, length, radius, max_depth = task
+    child = CoralGenerator(seed=seed, reuse_branches=reuse_branches,
+                           stream=(MAIN_BRANCH_STREAM, index))
+    child.generate_branch(start, direction, length, radius, 0, max_depth)
+    return child.vertices[:child.n_verts], child.faces[:child.n_faces]
 
 
 class CoralGenerator:
-    def __init__(self, seed: int = 42):
-        random.seed(seed)
-        self.vertices: List[Vec3] = []
-        self.faces: List[Tuple[int, ...]] = []
+    def __init__(self, seed: int = 42, initial_capacity: int = 4096,
+                 reuse_branches: bool = False, stream: tuple = ()):
+        self.seed = seed
+        # Random numbers are drawn from the generator in batches and consumed one by one.
+        # A non-empty stream selects an independent sequence derived from the seed.
+        self._rng = np.random.default_rng([seed, *stream] if stream else seed)
+        self._rand_buf = []
+        self._rand_pos = 0
+        # Mesh buffers grow by doubling; only the first n_verts/n_faces rows are valid.
+        # Face indices are 0-based and converted to OBJ's 1-based indices on write.
+        self.vertices = np.empty((initial_capacity, 3), dtype=np.float32)
+        self.faces = np.empty((initial_capacity, 3), dtype=np.int32)
+        self.n_verts = 0
+        self.n_faces = 0
         self.segments = 8  # Segments per cylinder ring
 
-    def add_cylinder(self, start: Vec3, end: Vec3, radius_start: float, radius_end: float) -> None:
+        # Unit-circle table shared by every ring
+        angles = 2 * np.pi * np.arange(self.segments) / self.segments
+        self._ring_cos = np.cos(angles)
+        self._ring_sin = np.sin(angles)
+
+        # Face indices joining two consecutive rings, relative to the first ring
+        i = np.arange(self.segments)
+        j = (i + 1) % self.segments
+        seg = self.segments
+        self._ring_faces = np.stack([
+            np.stack([i, j, seg + j], axis=1),
+            np.stack([i, seg + j, seg + i], axis=1),
+        ], axis=1).reshape(-1, 3).astype(np.int32)
+
+        # Sub-branch templates keyed by (depth, radius bucket, length bucket), each a
+        # (vertices, faces) mesh grown along +Y from the origin
+        self.reuse_branches = reuse_branches
+        self._templates = {}
+
+    def _child(self, *stream: int) -> 'CoralGenerator':
+        """
+        Return an empty generator with the same settings and template cache,
+        drawing from an independent random stream identified by stream.
+        """
+        child = CoralGenerator(seed=self.seed, reuse_branches=self.reuse_branches,
+                               stream=stream)
+        child._templates = self._templates
+        return child
+
+    def _random(self) -> float:
+        """Return the next uniform sample in [0, 1)."""
+        if self._rand_pos >= len(self._rand_buf):
+            self._rand_buf = self._rng.random(RANDOM_BATCH).tolist()
+            self._rand_pos = 0
+        value = self._rand_buf[self._rand_pos]
+        self._rand_pos += 1
+        return value
+
+    def _uniform(self, low: float, high: float) -> float:
+        """Return a uniform sample in [low, high)."""
+        return low + (high - low) * self._random()
+
+    def _reserve_verts(self, n: int) -> None:
+        """Make room for n more vertices, at least doubling capacity when full."""
+        if self.n_verts + n > len(self.vertices):
+            capacity = max(len(self.vertices) * 2, self.n_verts + n)
+            vertices = np.empty((capacity, 3), dtype=self.vertices.dtype)
+            vertices[:self.n_verts] = self.vertices[:self.n_verts]
+            self.vertices = vertices
+
+    def _reserve_faces(self, n: int) -> None:
+        """Make room for n more faces, at least doubling capacity when full."""
+        if self.n_faces + n > len(self.faces):
+            capacity = max(len(self.faces) * 2, self.n_faces + n)
+            faces = np.empty((capacity, 3), dtype=self.faces.dtype)
+            faces[:self.n_faces] = self.faces[:self.n_faces]
+            self.faces = faces
+
+    def _append_mesh(self, vertices: np.ndarray, faces: np.ndarray) -> None:
+        """Append a mesh whose faces index its own vertices."""
+        self._reserve_verts(len(vertices))
+        self._reserve_faces(len(faces))
+        self.vertices[self.n_verts:self.n_verts + len(vertices)] = vertices
+        self.faces[self.n_faces:self.n_faces + len(faces)] = faces + self.n_verts
+        self.n_verts += len(vertices)
+        self.n_faces += len(faces)
+
+    def _branch_template(self, length: float, radius: float, depth: int,
+                         max_depth: int) -> tuple:
+        """
+        Return the cached sub-branch mesh for this size bucket, growing it on first use.
+        Each template has its own random stream keyed by the bucket, so results stay
+        reproducible regardless of which branch asks for it first.
+        """
+        key = (depth, round(radius * 100), round(length * 10))
+        if key not in self._templates:
+            child = self._child(TEMPLATE_STREAM, *key)
+            child.generate_branch(np.zeros(3), UP, length, radius, depth, max_depth)
+            self._templates[key] = (child.vertices[:child.n_verts].copy(),
+                                    child.faces[:child.n_faces].copy())
+        return self._templates[key]
+
+    def add_cylinder(self, start: np.ndarray, end: np.ndarray, radius_start: float, radius_end: float) -> None:
         """Add a tapered cylinder between two points."""
-        # Calculate direction and perpendicular vectors
-        direction = Vec3(end.x - start.x, end.y - start.y, end.z - start.z)
-        length = math.sqrt(direction.x**2 + direction.y**2 + direction.z**2)
-        if length < 0.001:
-            return
+        seg = self.segments
+        self._reserve_verts(2 * seg)
+        self._reserve_faces(2 * seg)
 
-        direction = direction.normalize()
+        if _emit_cylinder(self.vertices, self.faces, self.n_verts, self.n_faces,
+                          start, end, radius_start, radius_end,
+                          self._ring_cos, self._ring_sin, self._ring_faces):
+            self.n_verts += 2 * seg
+            self.n_faces += 2 * seg
 
-        # Find perpendicular vectors
-        if abs(direction.y) < 0.9:
-            up = Vec3(0, 1, 0)
-        else:
-            up = Vec3(1, 0, 0)
-
-        # Cross products to get perpendicular basis
-        perp1 = Vec3(
-            direction.y * up.z - direction.z * up.y,
-            direction.z * up.x - direction.x * up.z,
-            direction.x * up.y - direction.y * up.x
-        ).normalize()
-
-        perp2 = Vec3(
-            direction.y * perp1.z - direction.z * perp1.y,
-            direction.z * perp1.x - direction.x * perp1.z,
-            direction.x * perp1.y - direction.y * perp1.x
-        ).normalize()
-
-        # Create vertices for cylinder rings
-        start_idx = len(self.vertices)
-
-        for ring in range(2):
-            center = start if ring == 0 else end
-            radius = radius_start if ring == 0 else radius_end
-
-            for i in range(self.segments):
-                angle = 2 * math.pi * i / self.segments
-                offset = perp1 * (math.cos(angle) * radius) + perp2 * (math.sin(angle) * radius)
-                self.vertices.append(center + offset)
-
-        # Create faces connecting the rings
-        for i in range(self.segments):
-            i1 = start_idx + i
-            i2 = start_idx + (i + 1) % self.segments
-            i3 = start_idx + self.segments + (i + 1) % self.segments
-            i4 = start_idx + self.segments + i
-
-            # Two triangles per quad (1-indexed for OBJ)
-            self.faces.append((i1 + 1, i2 + 1, i3 + 1))
-            self.faces.append((i1 + 1, i3 + 1, i4 + 1))
-
-    def generate_branch(self, start: Vec3, direction: Vec3, length: float,
+    def generate_branch(self, start: np.ndarray, direction: np.ndarray, length: float,
                         radius: float, depth: int, max_depth: int) -> None:
-        """Recursively generate branching coral structure."""
-        if depth > max_depth or radius < 0.005:
-            return
-
-        # Add some waviness to the branch
-        wave_freq = 0.3
-        wave_amp = 0.15 * radius
-        segments_per_branch = max(4, int(length / 0.15))  # More segments for detail
-
-        current_pos = start
-        current_dir = direction
-        current_radius = radius
-
-        for seg in range(segments_per_branch):
-            progress = seg / segments_per_branch
+        """
+        Generate branching coral structure.
+        Uses an explicit stack instead of recursion: when a sub-branch spawns, the
+        parent's progress is pushed back and resumed after the sub-branch, giving
+        the same depth-first order (and random draws) as a recursive walk.
+        """
+        # Each entry: position, direction, radius, next segment, branch length/radius, depth
+        stack = [(start, direction, radius, 0, length, radius, depth)]
+
+        while stack:
+            current_pos, current_dir, current_radius, first_seg, length, radius, depth = stack.pop()
+            if depth > max_depth or radius < 0.005:
+                continue
+
+            segments_per_branch = max(4, int(length / 0.15))  # More segments for detail
             seg_length = length / segments_per_branch
 
-            # Taper radius
-            next_radius = radius * (1 - progress * 0.4)
-
-            # Add slight random deviation
-            deviation = Vec3(
-                random.uniform(-0.2, 0.2),
-                random.uniform(0.1, 0.3),  # Bias upward
-                random.uniform(-0.2, 0.2)
-            )
-            current_dir = Vec3(
-                current_dir.x + deviation.x * 0.3,
-                current_dir.y + deviation.y * 0.3,
-                current_dir.z + deviation.z * 0.3
-            ).normalize()
-
-            next_pos = current_pos + current_dir * seg_length
-            self.add_cylinder(current_pos, next_pos, current_radius, next_radius)
-
-            current_pos = next_pos
-            current_radius = next_radius
-
-            # Chance to spawn sub-branches - higher probability for delicate coral
-            if depth < max_depth and seg > 0 and random.random() < 0.55:
-                # Branch direction - spread outward and upward
-                branch_angle = random.uniform(0.3, 0.9)  # 17-52 degrees, more spread
-                spin = random.uniform(0, 2 * math.pi)
-
-                # Create branch direction
-                branch_dir = Vec3(
-                    math.sin(branch_angle) * math.cos(spin),
-                    math.cos(branch_angle) * 0.7 + 0.3,  # Upward bias
-                    math.sin(branch_angle) * math.sin(spin)
-                ).normalize()
-
-                # Mix with current direction
-                branch_dir = Vec3(
-                    branch_dir.x * 0.6 + current_dir.x * 0.4,
-                    branch_dir.y * 0.6 + current_dir.y * 0.4,
-                    branch_dir.z * 0.6 + current_dir.z * 0.4
-                ).normalize()
-
-                branch_length = length * random.uniform(0.5, 0.8)
-                branch_radius = current_radius * random.uniform(0.65, 0.9)  # Keep more radius
-
-                self.generate_branch(
-                    current_pos, branch_dir, branch_length,
-                    branch_radius, depth + 1, max_depth
-                )
+            for seg in range(first_seg, segments_per_branch):
+                progress = seg / segments_per_branch
+
+                # Taper radius
+                next_radius = radius * (1 - progress * 0.4)
+
+                # Add slight random deviation
+                deviation = np.array([
+                    self._uniform(-0.2, 0.2),
+                    self._uniform(0.1, 0.3),  # Bias upward
+                    self._uniform(-0.2, 0.2)
+                ])
+                current_dir = normalize(current_dir + deviation * 0.3)
+
+                next_pos = current_pos + current_dir * seg_length
+                self.add_cylinder(current_pos, next_pos, current_radius, next_radius)
+
+                current_pos = next_pos
+                current_radius = next_radius
+
+                # Chance to spawn sub-branches - higher probability for delicate coral
+                if depth < max_depth and seg > 0 and self._random() < 0.55:
+                    # Branch direction - spread outward and upward
+                    branch_angle = self._uniform(0.3, 0.9)  # 17-52 degrees, more spread
+                    spin = self._uniform(0, 2 * math.pi)
+
+                    # Create branch direction
+                    branch_dir = normalize(np.array([
+                        math.sin(branch_angle) * math.cos(spin),
+                        math.cos(branch_angle) * 0.7 + 0.3,  # Upward bias
+                        math.sin(branch_angle) * math.sin(spin)
+                    ]))
+
+                    # Mix with current direction
+                    branch_dir = normalize(branch_dir * 0.6 + current_dir * 0.4)
+
+                    branch_length = length * self._uniform(0.5, 0.8)
+                    branch_radius = current_radius * self._uniform(0.65, 0.9)  # Keep more radius
+
+                    if self.reuse_branches:
+                        # Stamp a cached sub-branch, rotated onto branch_dir
+                        vertices, faces = self._branch_template(
+                            branch_length, branch_radius, depth + 1, max_depth)
+                        rotation = rotation_to(branch_dir)
+                        self._append_mesh(vertices @ rotation.T + current_pos, faces)
+                        continue
+
+                    # Resume this branch once the sub-branch is finished
+                    stack.append((current_pos, current_dir, current_radius, seg + 1,
+                                  length, radius, depth))
+                    stack.append((current_pos, branch_dir, branch_radius, 0,
+                                  branch_length, branch_radius, depth + 1))
+                    break
 
     def generate_coral(self, num_main_branches: int = 5, height: float = 3.0,
-                       base_radius: float = 0.15, max_depth: int = 4) -> None:
-        """Generate complete coral structure with multiple main branches."""
-        base_center = Vec3(0, 0, 0)
-
+                       base_radius: float = 0.15, max_depth: int = 4, workers: int = 1) -> None:
+        """
+        Generate complete coral structure with multiple main branches.
+        Each main branch grows from its own random stream, so they can be built in
+        parallel by a pool of worker processes without changing the result.
+        """
         # Create a small base mound
         for i in range(3):
             angle = 2 * math.pi * i / 3
-            mound_pos = Vec3(math.cos(angle) * 0.1, 0, math.sin(angle) * 0.1)
-            mound_top = Vec3(math.cos(angle) * 0.05, 0.1, math.sin(angle) * 0.05)
+            mound_pos = np.array([math.cos(angle) * 0.1, 0, math.sin(angle) * 0.1])
+            mound_top = np.array([math.cos(angle) * 0.05, 0.1, math.sin(angle) * 0.05])
             self.add_cylinder(mound_pos, mound_top, base_radius * 1.5, base_radius * 1.2)
 
         # Generate main branches
+        tasks = []
         for i in range(num_main_branches):
             # Spread branches in a fan pattern
             angle = (i / num_main_branches - 0.5) * math.pi * 0.8  # -70 to +70 degrees spread
-            spread = random.uniform(0.2, 0.5)
+            spread = self._uniform(0.2, 0.5)
 
-            direction = Vec3(
+            direction = normalize(np.array([
                 math.sin(angle) * spread,
-                0.85 + random.uniform(-0.1, 0.1),  # Mostly upward
-                random.uniform(-0.2, 0.2)
-            ).normalize()
+                0.85 + self._uniform(-0.1, 0.1),  # Mostly upward
+                self._uniform(-0.2, 0.2)
+            ]))
 
-            branch_height = height * random.uniform(0.7, 1.0)
-            branch_radius = base_radius * random.uniform(0.8, 1.0)
+            branch_height = height * self._uniform(0.7, 1.0)
+            branch_radius = base_radius * self._uniform(0.8, 1.0)
 
-            start_pos = Vec3(
-                random.uniform(-0.1, 0.1),
+            start_pos = np.array([
+                self._uniform(-0.1, 0.1),
                 0.1,
-                random.uniform(-0.05, 0.05)
-            )
+                self._uniform(-0.05, 0.05)
+            ])
+
+            tasks.append((self.seed, self.reuse_branches, i, start_pos, direction,
+                          branch_height, branch_radius, max_depth))
+
+        if workers > 1 and len(tasks) > 1:
+            with Pool(min(workers, len(tasks))) as pool:
+                meshes = pool.map(_grow_main_branch, tasks)
+        else:
+            meshes = map(_grow_main_branch, tasks)
 
-            self.generate_branch(start_pos, direction, branch_height, branch_radius, 0, max_depth)
+        for vertices, faces in meshes:
+            self._append_mesh(vertices, faces)
 
     def write_obj(self, filepath: str) -> None:
         """Write the coral mesh to an OBJ file."""
-        with open(filepath, 'w') as f:
+        mtl_name = filepath.replace('.obj', '.mtl')
+
+        with open(filepath, 'w', buffering=1 << 20) as f:
             f.write("# Branching Coral - Generated\n")
-            f.write(f"# Vertices: {len(self.vertices)}\n")
-            f.write(f"# Faces: {len(self.faces)}\n\n")
+            f.write(f"# Vertices: {self.n_verts}\n")
+            f.write(f"# Faces: {self.n_faces}\n\n")
 
             # Material reference
-            mtl_name = filepath.replace('.obj', '.mtl')
             f.write(f"mtllib {mtl_name.split('/')[-1]}\n")
             f.write("usemtl coral\n\n")
 
-            # Write vertices
-            for v in self.vertices:
-                f.write(f"v {v.x:.6f} {v.y:.6f} {v.z:.6f}\n")
-
+            # Vertex and face blocks are each formatted in one pass (faces 1-indexed for OBJ)
+            f.write(_format_rows("v %.6f %.6f %.6f\n", self.vertices[:self.n_verts]))
             f.write("\n")
+            f.write(_format_rows("f %d %d %d\n", self.faces[:self.n_faces] + 1))
 
-            # Write faces
-            for face in self.faces:
-                f.write(f"f {' '.join(str(i) for i in face)}\n")
-
-        print(f"Wrote {len(self.vertices)} vertices, {len(self.faces)} faces to {filepath}")
+        print(f"Wrote {self.n_verts} vertices, {self.n_faces} faces to {filepath}")
 
     def write_mtl(self, filepath: str) -> None:
         """Write material file with coral color."""
@@ -239,15 +399,20 @@ def main():
     parser.add_argument('--height', type=float, default=3.5, help='Coral height')
     parser.add_argument('-d', '--depth', type=int, default=4, help='Max branching depth')
     parser.add_argument('-r', '--radius', type=float, default=0.12, help='Base branch radius')
+    parser.add_argument('--reuse-branches', action='store_true',
+                        help='Reuse cached geometry for similar sub-branches (faster, less varied)')
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help='Worker processes for growing main branches (default: 1)')
 
     args = parser.parse_args()
 
-    generator = CoralGenerator(seed=args.seed)
+    generator = CoralGenerator(seed=args.seed, reuse_branches=args.reuse_branches)
     generator.generate_coral(
         num_main_branches=args.branches,
         height=args.height,
         base_radius=args.radius,
-        max_depth=args.depth
+        max_depth=args.depth,
+        workers=args.jobs
     )
 
     generator.write_obj(args.output)
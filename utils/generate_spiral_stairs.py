@@ -8,10 +8,13 @@ Usage:
 """
 
 import argparse
-import json
 import math
 import os
 
+import numpy as np
+
+from voxel_io import VOXEL_DTYPE, apply_stripes, save_model
+
 
 def generate_spiral_stairs(
     center_radius: float = 7,      # Distance from center to stairs
@@ -19,11 +22,15 @@ def generate_spiral_stairs(
     stair_width: int = 3,          # Width of each stair (voxels)
     steps_per_rotation: int = 24,  # How many steps for one full circle
     color: tuple = (139, 90, 43),  # Wood brown color
-    add_railing: bool = False      # Whether to add railing
+    add_railing: bool = False,     # Whether to add railing
+    stripe_height: int = None,     # Stripe the stairs in bands this tall instead of `color`
+    stripe_colors: tuple = ((220, 60, 60), (255, 255, 255))  # Alternating stripe colors
 ) -> dict:
-    """Generate a spiral staircase as voxel data."""
-
-    voxels = []
+    """
+    Generate a spiral staircase as voxel data.
+    With stripe_height set, the stairs are striped the same way stripe_lighthouse.py
+    would, without a separate load/recolor/save pass.
+    """
 
     # Each step rises 1 voxel, so total_steps = total_height
     total_steps = total_height
@@ -37,85 +44,69 @@ def generate_spiral_stairs(
     print(f"  Steps per rotation: {steps_per_rotation}")
     print(f"  Total rotations: {total_height / steps_per_rotation:.1f}")
 
-    # Track placed voxels to avoid duplicates
-    placed = set()
-
-    for step in range(total_steps):
-        angle = step * angle_per_step
-        y = step  # Each step is 1 voxel higher
-
-        # Calculate center of this step
-        cx = math.cos(angle) * center_radius
-        cz = math.sin(angle) * center_radius
-
-        # Calculate direction perpendicular to radius (tangent)
-        tx = -math.sin(angle)
-        tz = math.cos(angle)
-
-        # Calculate radial direction (away from center - outward)
-        rx = math.cos(angle)
-        rz = math.sin(angle)
-
-        # Place stair voxels - extend outward from lighthouse wall
-        for w in range(-stair_width // 2, stair_width // 2 + 1):  # Tangent width
-            for d in range(3):  # Depth outward (0 = touching wall, 2 = outer edge)
-                sx = int(round(cx + tx * w + rx * d))
-                sz = int(round(cz + tz * w + rz * d))
-
-                key = (sx, y, sz)
-                if key not in placed:
-                    placed.add(key)
-                    voxels.append({
-                        'x': sx, 'y': y, 'z': sz,
-                        'r': color[0], 'g': color[1], 'b': color[2]
-                    })
+    # Per-step trig, computed once for every step
+    steps = np.arange(total_steps)
+    angles = steps * angle_per_step
+    cos_a = np.cos(angles)
+    sin_a = np.sin(angles)
+
+    # Stair footprint: tangent width x depth outward (0 = touching wall, 2 = outer edge)
+    ws = np.arange(-stair_width // 2, stair_width // 2 + 1)[None, :, None]
+    ds = np.arange(3)[None, None, :]
+
+    # Step centers, tangent (-sin, cos) and radial (cos, sin) directions, shaped to
+    # broadcast over (step, width, depth). Each step is 1 voxel higher.
+    cx = (cos_a * center_radius)[:, None, None]
+    cz = (sin_a * center_radius)[:, None, None]
+    tx, tz = -sin_a[:, None, None], cos_a[:, None, None]
+    rx, rz = cos_a[:, None, None], sin_a[:, None, None]
+
+    # Place stair voxels - extend outward from lighthouse wall
+    sx = np.rint(cx + tx * ws + rx * ds)
+    sz = np.rint(cz + tz * ws + rz * ds)
+    sy = np.broadcast_to(steps[:, None, None], sx.shape)
+    stairs = np.stack([sx.ravel(), sy.ravel(), sz.ravel()], axis=1)
 
     # Add bridge at top to connect stairs to lighthouse
     top_y = total_steps - 1
-    top_angle = top_y * angle_per_step
-    top_cx = math.cos(top_angle) * center_radius
-    top_cz = math.sin(top_angle) * center_radius
+    top_cx = cos_a[top_y] * center_radius
+    top_cz = sin_a[top_y] * center_radius
+    tx, tz = -sin_a[top_y], cos_a[top_y]
+    rx, rz = cos_a[top_y], sin_a[top_y]
     # Extend bridge inward toward lighthouse center
-    for d in range(-4, 1):  # Go inward from the stair position
-        for w in range(-2, 3):  # Width of bridge
-            tx = -math.sin(top_angle)
-            tz = math.cos(top_angle)
-            rx = math.cos(top_angle)
-            rz = math.sin(top_angle)
-            bx = int(round(top_cx + tx * w + rx * d))
-            bz = int(round(top_cz + tz * w + rz * d))
-            key = (bx, top_y, bz)
-            if key not in placed:
-                placed.add(key)
-                voxels.append({
-                    'x': bx, 'y': top_y, 'z': bz,
-                    'r': color[0], 'g': color[1], 'b': color[2]
-                })
-
-    # Calculate grid size
-    if voxels:
-        xs = [v['x'] for v in voxels]
-        ys = [v['y'] for v in voxels]
-        zs = [v['z'] for v in voxels]
-
-        min_x, max_x = min(xs), max(xs)
-        min_y, max_y = min(ys), max(ys)
-        min_z, max_z = min(zs), max(zs)
-
-        # Normalize coordinates to start from 0
-        for v in voxels:
-            v['x'] -= min_x
-            v['y'] -= min_y
-            v['z'] -= min_z
-
-        grid_size = {
-            'x': max_x - min_x + 1,
-            'y': max_y - min_y + 1,
-            'z': max_z - min_z + 1
-        }
+    bd = np.arange(-4, 1)[:, None]  # Go inward from the stair position
+    bw = np.arange(-2, 3)[None, :]  # Width of bridge
+    bx = np.rint(top_cx + tx * bw + rx * bd).ravel()
+    bz = np.rint(top_cz + tz * bw + rz * bd).ravel()
+    bridge = np.stack([bx, np.full_like(bx, top_y), bz], axis=1)
+
+    # Drop duplicates, keeping the first occurrence of each voxel in placement order.
+    # Coordinates are packed 21 bits per axis into one int64 key so the dedupe is
+    # a flat integer sort rather than a row-wise unique.
+    coords = np.concatenate([stairs, bridge]).astype(np.int64)
+    mask = (1 << 21) - 1
+    keys = (coords[:, 0] & mask) | ((coords[:, 1] & mask) << 21) | ((coords[:, 2] & mask) << 42)
+    _, first = np.unique(keys, return_index=True)
+    coords = coords[np.sort(first)]
+
+    # Calculate grid size and normalize coordinates to start from 0,
+    # reducing all three axes at once
+    if len(coords):
+        lo = coords.min(axis=0)
+        hi = coords.max(axis=0)
+        coords -= lo
+        size_x, size_y, size_z = (int(n) for n in hi - lo + 1)
+        grid_size = {'x': size_x, 'y': size_y, 'z': size_z}
     else:
         grid_size = {'x': 0, 'y': 0, 'z': 0}
 
+    voxels = np.empty(len(coords), dtype=VOXEL_DTYPE)
+    voxels['x'], voxels['y'], voxels['z'] = coords.T
+    if stripe_height:
+        apply_stripes(voxels, stripe_height, *stripe_colors)
+    else:
+        voxels['r'], voxels['g'], voxels['b'] = color
+
     print(f"  Generated {len(voxels)} voxels")
     print(f"  Grid size: {grid_size['x']} x {grid_size['y']} x {grid_size['z']}")
 
@@ -139,19 +130,32 @@ def main():
                         help='Width of stairs in voxels (default: 3)')
     parser.add_argument('-s', '--steps-per-rotation', type=int, default=24,
                         help='Steps for one full rotation (default: 24)')
+    parser.add_argument('--compact', action='store_true',
+                        help='Output compact [x, y, z, r, g, b] rows instead of objects')
+    parser.add_argument('--stripe-height', type=int, default=None,
+                        help='Stripe the stairs in bands of this many voxels (default: solid wood)')
+    parser.add_argument('--color1', default='220,60,60',
+                        help='First stripe color as R,G,B (default: 220,60,60 red)')
+    parser.add_argument('--color2', default='255,255,255',
+                        help='Second stripe color as R,G,B (default: 255,255,255 white)')
 
     args = parser.parse_args()
 
+    # Parse colors
+    color1 = tuple(int(x) for x in args.color1.split(','))
+    color2 = tuple(int(x) for x in args.color2.split(','))
+
     data = generate_spiral_stairs(
         center_radius=args.radius,
         total_height=args.height,
         stair_width=args.width,
-        steps_per_rotation=args.steps_per_rotation
+        steps_per_rotation=args.steps_per_rotation,
+        stripe_height=args.stripe_height,
+        stripe_colors=(color1, color2)
     )
 
     print(f"Saving to {args.output}...")
-    with open(args.output, 'w') as f:
-        json.dump(data, f, indent=2)
+    save_model(args.output, data, indent=None if args.compact else 2, compact=args.compact)
 
     file_size = os.path.getsize(args.output)
     print(f"Done! Output: {args.output} ({file_size / 1024:.1f} KB)")
@@ -0,0 +1,22 @@
+"""
+Optional Numba support for the asset utilities.
+
+With Numba installed, @njit compiles the decorated kernels to native code
+and prange loops run in parallel under @njit(parallel=True).
+Without it the decorator is a no-op, prange is range, and the same kernels
+run as plain Python, so the scripts keep working (just slower) on a bare
+NumPy install.
+"""
+
+try:
+    from numba import njit, prange
+    HAVE_NUMBA = True
+except ImportError:
+    HAVE_NUMBA = False
+    prange = range
+
+    def njit(*args, **kwargs):
+        """Stand-in for numba.njit that returns the function unchanged."""
+        if len(args) == 1 and callable(args[0]) and not kwargs:
+            return args[0]
+        return lambda func: func
@@ -8,18 +8,20 @@ Usage:
 """
 
 import argparse
-import json
 import os
 import sys
 
+import numpy as np
+
+from voxel_io import apply_stripes, load_model, save_model
+
 
 def add_stripes(input_path: str, output_path: str, stripe_height: int = 8,
                 color1: tuple = (220, 60, 60), color2: tuple = (255, 255, 255)):
     """Add horizontal stripes to a voxel model based on Y coordinate."""
 
     print(f"Loading {input_path}...")
-    with open(input_path, 'r') as f:
-        data = json.load(f)
+    data, compact = load_model(input_path)
 
     voxels = data['voxels']
     grid_size = data['gridSize']
@@ -30,31 +32,19 @@ def add_stripes(input_path: str, output_path: str, stripe_height: int = 8,
     print(f"  Color 2 (white): RGB{color2}")
 
     # Find Y range
-    y_values = [v['y'] for v in voxels]
-    min_y = min(y_values)
-    max_y = max(y_values)
+    y_values = voxels['y'].astype(np.int32)
+    min_y = int(y_values.min())
+    max_y = int(y_values.max())
     print(f"  Y range: {min_y} to {max_y}")
 
     # Apply stripes based on Y coordinate
-    modified = 0
-    for v in voxels:
-        # Calculate which stripe band this voxel is in
-        relative_y = v['y'] - min_y
-        stripe_index = relative_y // stripe_height
-
-        # Alternate colors
-        if stripe_index % 2 == 0:
-            v['r'], v['g'], v['b'] = color1
-        else:
-            v['r'], v['g'], v['b'] = color2
-        modified += 1
+    apply_stripes(voxels, stripe_height, color1, color2)
 
-    print(f"  Modified {modified} voxels")
+    print(f"  Modified {len(voxels)} voxels")
 
     # Save output
     print(f"Saving to {output_path}...")
-    with open(output_path, 'w') as f:
-        json.dump(data, f, indent=2)
+    save_model(output_path, data, compact=compact)
 
     file_size = os.path.getsize(output_path)
     print(f"Done! Output: {output_path} ({file_size / 1024:.1f} KB)")
@@ -0,0 +1,190 @@
+"""
+Shared voxel model helpers for the asset utilities.
+
+Voxels are handled as a NumPy structured array (one record per voxel with
+x/y/z/r/g/b fields) and converted to the JSON model format only when a file
+is read or written. Both JSON voxel layouts are supported: a list of
+{'x', 'y', 'z', 'r', 'g', 'b'} objects (what the game loads) and the compact
+list of [x, y, z, r, g, b] rows produced by `voxelize.py --compact`.
+"""
+
+import json
+from typing import Optional, Tuple
+
+import numpy as np
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; fall back to the stdlib encoder
+    orjson = None
+
+try:
+    import ijson
+except ImportError:  # ijson is optional; fall back to json.load
+    ijson = None
+
+
+VOXEL_DTYPE = np.dtype([
+    ('x', np.int16), ('y', np.int16), ('z', np.int16),
+    ('r', np.uint8), ('g', np.uint8), ('b', np.uint8),
+])
+
+
+def voxels_from_dicts(voxels: list) -> np.ndarray:
+    """Convert a list of {'x', 'y', 'z', 'r', 'g', 'b'} dicts to a voxel array."""
+    return np.fromiter(
+        ((v['x'], v['y'], v['z'], v['r'], v['g'], v['b']) for v in voxels),
+        dtype=VOXEL_DTYPE, count=len(voxels)
+    )
+
+
+def voxels_to_dicts(voxels: np.ndarray) -> list:
+    """Convert a voxel array to the list-of-dicts JSON representation."""
+    names = VOXEL_DTYPE.names
+    return [dict(zip(names, row)) for row in voxels.tolist()]
+
+
+def voxels_from_rows(rows: list) -> np.ndarray:
+    """Convert a list of [x, y, z, r, g, b] rows to a voxel array."""
+    return np.fromiter(map(tuple, rows), dtype=VOXEL_DTYPE, count=len(rows))
+
+
+def voxels_to_rows(voxels: np.ndarray) -> np.ndarray:
+    """Convert a voxel array to an (N, 6) integer array of [x, y, z, r, g, b] rows."""
+    return np.stack([voxels[name] for name in VOXEL_DTYPE.names], axis=1).astype(np.int32)
+
+
+# JSON text of one voxel in each layout, filled from an [x, y, z, r, g, b] row
+_VOXEL_OBJECT_FORMAT = '{"x":%d,"y":%d,"z":%d,"r":%d,"g":%d,"b":%d}'
+_VOXEL_ROW_FORMAT = '[%d,%d,%d,%d,%d,%d]'
+
+# Stands in for the voxel list while the rest of a model is encoded
+_VOXELS_PLACEHOLDER = '__voxel_io_voxels__'
+
+
+def _format_voxels(voxels: np.ndarray, template: str) -> bytes:
+    """Format a voxel array as a JSON list in a single %-format call, without per-voxel objects."""
+    rows = voxels_to_rows(voxels)
+    return ('[' + ','.join([template] * len(rows)) % tuple(rows.ravel().tolist()) + ']').encode()
+
+
+def apply_stripes(voxels: np.ndarray, stripe_height: int,
+                  color1: tuple, color2: tuple) -> None:
+    """
+    Recolor voxels in place with horizontal bands stripe_height voxels tall,
+    alternating color1/color2 upward from the lowest voxel.
+    """
+    y_values = voxels['y'].astype(np.int32)
+    even = (y_values - y_values.min()) // stripe_height % 2 == 0
+    for channel, c1, c2 in zip('rgb', color1, color2):
+        voxels[channel] = np.where(even, c1, c2)
+
+
+def _build_value(events) -> object:
+    """Assemble the next complete JSON value from an ijson event stream."""
+    builder = ijson.ObjectBuilder()
+    depth = 0
+    for _, event, value in events:
+        builder.event(event, value)
+        if event in ('start_map', 'start_array'):
+            depth += 1
+        elif event in ('end_map', 'end_array'):
+            depth -= 1
+        if depth == 0:
+            return builder.value
+
+
+def _stream_voxels(events, layout: dict):
+    """
+    Yield (x, y, z, r, g, b) tuples from the 'voxels' array of an ijson event
+    stream, one voxel at a time. Records in layout['compact'] whether the
+    voxels were rows rather than objects.
+    """
+    fields = {}
+    row = []
+    for prefix, event, value in events:
+        if prefix == 'voxels' and event == 'end_array':
+            return
+        if prefix == 'voxels.item.item':
+            row.append(value)
+        elif prefix.startswith('voxels.item.') and event == 'number':
+            fields[prefix[12:]] = value
+        elif prefix == 'voxels.item' and event == 'end_array':
+            layout['compact'] = True
+            yield tuple(row)
+            row = []
+        elif prefix == 'voxels.item' and event == 'end_map':
+            yield (fields['x'], fields['y'], fields['z'],
+                   fields['r'], fields['g'], fields['b'])
+            fields = {}
+
+
+def _stream_model(f) -> Tuple[dict, bool]:
+    """Parse a model with ijson, decoding voxels straight into a voxel array."""
+    data = {}
+    layout = {'compact': False}
+    events = ijson.parse(f, use_float=True)
+    for prefix, event, value in events:
+        if prefix == '' and event == 'map_key':
+            if value == 'voxels':
+                next(events)  # start_array
+                data['voxels'] = np.fromiter(_stream_voxels(events, layout), dtype=VOXEL_DTYPE)
+            else:
+                data[value] = _build_value(events)
+    return data, layout['compact']
+
+
+def load_model(path: str) -> Tuple[dict, bool]:
+    """
+    Load a voxel model JSON file, returning its voxels as a voxel array.
+    Also returns whether the file used the compact row layout.
+    With ijson installed the voxel list is streamed rather than materialized
+    as Python objects first.
+    """
+    if ijson is not None:
+        with open(path, 'rb') as f:
+            return _stream_model(f)
+
+    with open(path, 'r') as f:
+        data = json.load(f)
+    voxels = data['voxels']
+    compact = bool(voxels) and isinstance(voxels[0], list)
+    data['voxels'] = voxels_from_rows(voxels) if compact else voxels_from_dicts(voxels)
+    return data, compact
+
+
+def save_model(path: str, data: dict, indent: Optional[int] = None,
+               compact: bool = False) -> None:
+    """
+    Write a voxel model to JSON, converting a voxel array back to dicts
+    (or to [x, y, z, r, g, b] rows when compact is set).
+    Output has no whitespace unless an indent is given; orjson is used when available.
+    Without an indent, a voxel array is formatted straight to JSON text and spliced
+    into the encoded model, so no per-voxel dicts or lists are built.
+    """
+    out = dict(data)
+    voxel_text = None
+    if isinstance(out['voxels'], np.ndarray):
+        if compact and orjson is not None:
+            out['voxels'] = voxels_to_rows(out['voxels'])
+        elif not indent:
+            voxel_text = _format_voxels(out['voxels'], _VOXEL_ROW_FORMAT if compact else _VOXEL_OBJECT_FORMAT)
+            out['voxels'] = _VOXELS_PLACEHOLDER
+        elif compact:
+            out['voxels'] = voxels_to_rows(out['voxels']).tolist()
+        else:
+            out['voxels'] = voxels_to_dicts(out['voxels'])
+
+    if orjson is not None:
+        option = orjson.OPT_SERIALIZE_NUMPY
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        encoded = orjson.dumps(out, option=option)
+    else:
+        separators = None if indent else (',', ':')
+        encoded = json.dumps(out, indent=indent, separators=separators).encode()
+
+    if voxel_text is not None:
+        encoded = encoded.replace(b'"' + _VOXELS_PLACEHOLDER.encode() + b'"', voxel_text, 1)
+    with open(path, 'wb') as f:
+        f.write(encoded)
@@ -8,61 +8,64 @@ Usage:
 """
 
 import argparse
-import json
 import os
+import re
 import sys
+from concurrent.futures import ProcessPoolExecutor
 from dataclasses import dataclass
+from multiprocessing import shared_memory
 from typing import List, Tuple, Dict, Optional
 import math
 
+import numpy as np
 
-@dataclass
-class Vec3:
-    x: float
-    y: float
-    z: float
+from jit import HAVE_NUMBA, njit, prange
+from voxel_io import VOXEL_DTYPE, save_model
 
-    def __add__(self, other):
-        return Vec3(self.x + other.x, self.y + other.y, self.z + other.z)
+try:
+    import cupy
+except ImportError:  # CuPy is optional; --gpu falls back to the CPU rasterizer
+    cupy = None
 
-    def __sub__(self, other):
-        return Vec3(self.x - other.x, self.y - other.y, self.z - other.z)
+# Edge length, in cells, of the grid tiles the rasterizer fills one at a time
+TILE_SIZE = 16
 
-    def __mul__(self, scalar):
-        return Vec3(self.x * scalar, self.y * scalar, self.z * scalar)
+# Most (triangle, cell) pairs tested in one GPU kernel launch
+GPU_BATCH_PAIRS = 1 << 24
 
-    def dot(self, other):
-        return self.x * other.x + self.y * other.y + self.z * other.z
+# Without Numba, meshes with at least this many triangles are rasterized in
+# x-slabs across worker processes; smaller ones don't repay the process startup
+SHARD_MIN_TRIANGLES = 20000
 
-    def cross(self, other):
-        return Vec3(
-            self.y * other.z - self.z * other.y,
-            self.z * other.x - self.x * other.z,
-            self.x * other.y - self.y * other.x
-        )
 
-    def length(self):
-        return math.sqrt(self.x * self.x + self.y * self.y + self.z * self.z)
+@dataclass
+class Triangles:
+    """
+    Triangle soup stored as parallel arrays, one row per triangle.
+    Corners stay float64: OBJ geometry often lies exactly on cell faces, and in
+    float32 those touching cases round either way and change the voxel set.
+    """
+    v0: np.ndarray      # (N, 3) float64 first corner
+    v1: np.ndarray      # (N, 3) float64 second corner
+    v2: np.ndarray      # (N, 3) float64 third corner
+    material: np.ndarray  # (N,) uint16 index into palette
+    palette: np.ndarray   # (K, 3) uint8 distinct RGB colors; materials of one color share an index
 
-    def normalize(self):
-        l = self.length()
-        if l > 0:
-            return Vec3(self.x / l, self.y / l, self.z / l)
-        return Vec3(0, 0, 0)
+    def __len__(self):
+        return len(self.material)
 
 
 @dataclass
-class Triangle:
-    v0: Vec3
-    v1: Vec3
-    v2: Vec3
-    color: Tuple[int, int, int] = (128, 128, 128)
+class BoundingBox:
+    min_pt: np.ndarray  # (3,) float64 minimum corner
+    max_pt: np.ndarray  # (3,) float64 maximum corner
 
 
-@dataclass
-class BoundingBox:
-    min_pt: Vec3
-    max_pt: Vec3
+def bounding_box(*points: np.ndarray) -> BoundingBox:
+    """Return the bounding box of one or more (N, 3) point arrays."""
+    lo = np.minimum.reduce([p.min(axis=0) for p in points])
+    hi = np.maximum.reduce([p.max(axis=0) for p in points])
+    return BoundingBox(lo, hi)
 
 
 def parse_mtl(mtl_path: str) -> Dict[str, Tuple[int, int, int]]:
@@ -129,17 +132,116 @@ def parse_mtl(mtl_path: str) -> Dict[str, Tuple[int, int, int]]:
     return materials
 
 
-def parse_obj(obj_path: str, exclude_materials: List[str] = None, include_objects: List[str] = None) -> Tuple[List[Triangle], BoundingBox]:
-    """Parse OBJ file and return list of triangles."""
-    vertices = []
-    triangles = []
+def parse_vertex_lines(lines: List[bytes]) -> np.ndarray:
+    """
+    Parse the payloads of OBJ 'v ' lines into an (N, 3) float64 array.
+    The common case of exactly three coordinates per line is parsed in one
+    np.fromstring call; lines with extra values (w, vertex colors) fall back
+    to a per-line split that keeps only x, y, z.
+    """
+    try:
+        values = np.fromstring(b'\n'.join(lines), sep=' ')
+        if len(values) == 3 * len(lines):
+            return values.reshape(-1, 3)
+    except ValueError:
+        pass
+
+    coords = []
+    for line in lines:
+        parts = line.split()
+        if len(parts) < 3:
+            raise ValueError(f"Malformed vertex line: v {line.decode('utf-8', 'ignore')}")
+        coords.append((float(parts[0]), float(parts[1]), float(parts[2])))
+    return np.array(coords, dtype=np.float64).reshape(-1, 3)
+
+
+# Strips the /vt/vn suffix from face tokens, leaving just the vertex index
+FACE_TOKEN_SUFFIX = re.compile(rb'/\S*')
+
+
+def parse_face_lines(lines: List[bytes], vertex_counts: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Resolve the payloads of OBJ 'f ' lines to 0-based vertex indices.
+    vertex_counts[k] is the number of vertices defined before face k, which is what
+    negative (relative) indices refer to. Returns the valid indices of all faces in
+    order and the face each one belongs to; invalid tokens are dropped.
+    """
+    # Fast path: strip suffixes and parse every face in one call, with a 0 token
+    # (never a valid OBJ index) separating consecutive faces
+    try:
+        values = np.fromstring(FACE_TOKEN_SUFFIX.sub(b'', b' 0 '.join(lines)), dtype=np.int64, sep=' ')
+        separators = values == 0
+        if np.count_nonzero(separators) != len(lines) - 1:
+            raise ValueError("face contains a 0 index")
+        face_ids = np.cumsum(separators)[~separators]
+        indices = values[~separators]
+    except ValueError:
+        # Unusual tokens: parse line by line, skipping anything that isn't an integer
+        indices, face_ids = [], []
+        for k, line in enumerate(lines):
+            for part in line.split():
+                # Format can be: v, v/vt, v/vt/vn, or v//vn
+                try:
+                    indices.append(int(part.split(b'/')[0]))
+                    face_ids.append(k)
+                except ValueError:
+                    continue
+        indices = np.array(indices, dtype=np.int64)
+        face_ids = np.array(face_ids, dtype=np.int64)
+
+    # OBJ indices are 1-based, can be negative
+    counts = vertex_counts[face_ids]
+    indices = np.where(indices < 0, counts + indices + 1, indices)
+    valid = (indices > 0) & (indices <= counts)
+    return (indices[valid] - 1).astype(np.int32), face_ids[valid]
+
+
+def fan_triangulate(indices: np.ndarray, face_ids: np.ndarray, n_faces: int) -> Tuple[np.ndarray, ...]:
+    """
+    Fan-triangulate faces given as per-face runs of vertex indices.
+    Returns the three int32 corner index arrays and the source face of each
+    triangle; face ids come out in ascending order.
+    """
+    sizes = np.bincount(face_ids, minlength=n_faces)
+    starts = np.cumsum(sizes) - sizes
+    rank = np.arange(len(indices)) - starts[face_ids]
+    # Vertex j of a face (1 <= j <= size-2) opens triangle (0, j, j+1)
+    corner = np.flatnonzero((rank >= 1) & (rank <= sizes[face_ids] - 2))
+    tri_faces = face_ids[corner]
+    return indices[starts[tri_faces]], indices[corner], indices[corner + 1], tri_faces
+
+
+# OBJ keywords that change the state applied to the faces after them
+STATE_KEYWORDS = (b'usemtl', b'o')
+
+
+def _record_positions(buf: np.ndarray, newlines: np.ndarray, keyword: bytes) -> np.ndarray:
+    """
+    Return the offsets of the newlines in buf that are followed by keyword + ' ',
+    i.e. that start a record of that type.
+    """
+    newlines = newlines[newlines + len(keyword) + 1 < len(buf)]
+    match = buf[newlines + len(keyword) + 1] == 0x20
+    for i, c in enumerate(keyword):
+        match &= buf[newlines + 1 + i] == c
+    return newlines[match]
+
+
+def parse_obj(obj_path: str, exclude_materials: List[str] = None, include_objects: List[str] = None) -> Tuple[Triangles, BoundingBox]:
+    """Parse OBJ file and return its triangles."""
     materials = {}
-    current_color = (128, 128, 128)  # Default gray
-    current_material = None
-    current_object = None
+    # Materials are interned into a palette of distinct colors as they are first used
+    palette = {None: 0}
+    palette_colors = [(128, 128, 128)]  # Default gray
+    color_index = {palette_colors[0]: 0}
     exclude_materials = exclude_materials or []
     include_objects = include_objects or []
-    excluded_count = 0
+    # Filters are matched case-insensitively; lower them once, and decide each
+    # distinct material or object name only once
+    exclude_lower = [excl.lower() for excl in exclude_materials]
+    include_lower = {inc.lower() for inc in include_objects}
+    material_skip = {}
+    object_skip = {}
 
     # Look for MTL file
     obj_dir = os.path.dirname(obj_path)
@@ -147,311 +249,980 @@ def parse_obj(obj_path: str, exclude_materials: List[str] = None, include_object
 
     print(f"Parsing OBJ file: {obj_path}")
 
-    # First pass: find MTL reference and parse it
-    with open(obj_path, 'r', encoding='utf-8', errors='ignore') as f:
-        for line in f:
-            if line.startswith('mtllib '):
-                mtl_name = line[7:].strip()
-                mtl_path = os.path.join(obj_dir, mtl_name)
-                if mtl_path.startswith('./'):
-                    mtl_path = os.path.join(obj_dir, mtl_name[2:])
-                materials = parse_mtl(mtl_path)
-                print(f"  Found {len(materials)} materials")
-                break
+    file_size = os.path.getsize(obj_path)
+    if file_size == 0:
+        raise ValueError("No vertices found in OBJ file")
 
-    # Second pass: parse vertices and faces
-    line_count = 0
-    face_count = 0
-
-    with open(obj_path, 'r', encoding='utf-8', errors='ignore') as f:
-        for line in f:
-            line_count += 1
-            line = line.strip()
-
-            if line.startswith('v '):
-                # Vertex
-                parts = line[2:].split()
-                if len(parts) >= 3:
-                    vertices.append(Vec3(
-                        float(parts[0]),
-                        float(parts[1]),
-                        float(parts[2])
-                    ))
-
-            elif line.startswith('usemtl '):
-                # Material switch
-                mat_name = line[7:].strip()
-                current_material = mat_name
-                if mat_name in materials:
-                    current_color = materials[mat_name]
+    # Work on raw bytes; only names are ever decoded. With a newline in front, every
+    # record is found by a regex search that starts with a literal '\n', which the
+    # regex engine scans for quickly. The file is read straight in behind that
+    # newline rather than concatenated onto it, saving a copy of the whole file.
+    data = bytearray(file_size + 1)
+    data[0] = 0x0A
+    with open(obj_path, 'rb') as f:
+        f.readinto(memoryview(data)[1:])
+
+    # Find the MTL reference with a C-level search instead of a separate pass over the lines
+    match = re.search(rb'\nmtllib ([^\n]*)', data)
+    if match:
+        mtl_name = match.group(1).decode('utf-8', 'ignore').strip()
+        mtl_path = os.path.join(obj_dir, mtl_name)
+        if mtl_path.startswith('./'):
+            mtl_path = os.path.join(obj_dir, mtl_name[2:])
+        materials = parse_mtl(mtl_path)
+        print(f"  Found {len(materials)} materials")
+
+    # Indented lines are rare; unindent them so every record follows a newline
+    if re.search(rb'\n[ \t]', data):
+        data = re.sub(rb'\n[ \t]+', b'\n', data)
+
+    # Pull out all vertex and face payloads in bulk, plus where each record sits
+    # in the file, so per-face state can be looked up by position afterwards
+    vertex_lines = re.findall(rb'\nv ([^\n]*)', data)
+    face_lines = re.findall(rb'\nf ([^\n]*)', data)
+    buf = np.frombuffer(data, dtype=np.uint8)
+    newlines = np.flatnonzero(buf == 0x0A)
+    vertex_pos = _record_positions(buf, newlines, b'v')
+    face_pos = _record_positions(buf, newlines, b'f')
+    # Material switches and object names, each with its offset, picked out of the
+    # line starts already found rather than by another scan over the file.
+    # A keyword with no name after it is not a record and leaves the state unchanged.
+    line_ends = np.append(newlines[1:], len(buf))
+    records = []
+    for keyword in STATE_KEYWORDS:
+        positions = _record_positions(buf, newlines, keyword)
+        ends = line_ends[np.searchsorted(newlines, positions)]
+        names = (data[pos + len(keyword) + 2:end].strip().decode('utf-8', 'ignore')
+                 for pos, end in zip(positions.tolist(), ends.tolist()))
+        records += [(pos, keyword, name) for pos, name in zip(positions.tolist(), names) if name]
+    records.sort()
+
+    # Walk the (few) state records in file order. Index 0 of each table is the state
+    # before the first record: default material, no object.
+    material_pos, material_index, material_excluded = [-1], [0], [False]
+    object_pos, object_skipped = [-1], [False]
+    for pos, keyword, name in records:
+        if keyword == b'usemtl':
+            # Material switch
+            if name not in palette:
+                if name in materials:
+                    color = tuple(materials[name])
                 else:
                     # Generate a color based on material name hash
-                    h = hash(mat_name)
-                    current_color = (
+                    h = hash(name)
+                    color = (
                         80 + (h % 120),
                         80 + ((h >> 8) % 120),
                         80 + ((h >> 16) % 120)
                     )
-
-            elif line.startswith('o '):
-                # Object name
-                current_object = line[2:].strip()
-
-            elif line.startswith('f '):
+                if color not in color_index:
+                    color_index[color] = len(palette_colors)
+                    palette_colors.append(color)
+                palette[name] = color_index[color]
                 # Skip faces from excluded materials
-                if current_material and any(excl.lower() in current_material.lower() for excl in exclude_materials):
-                    excluded_count += 1
-                    continue
-                # Skip faces from non-included objects (if filter is set)
-                # Use exact match (case-insensitive) to avoid partial matches
-                if include_objects and current_object and not any(inc.lower() == current_object.lower() for inc in include_objects):
-                    excluded_count += 1
-                    continue
-
-                # Face - can be triangles, quads, or n-gons
-                parts = line[2:].split()
-                face_vertices = []
-
-                for part in parts:
-                    # Format can be: v, v/vt, v/vt/vn, or v//vn
-                    idx = part.split('/')[0]
-                    try:
-                        vi = int(idx)
-                        # OBJ indices are 1-based, can be negative
-                        if vi < 0:
-                            vi = len(vertices) + vi + 1
-                        if 0 < vi <= len(vertices):
-                            face_vertices.append(vertices[vi - 1])
-                    except ValueError:
-                        continue
-
-                # Triangulate face (fan triangulation)
-                if len(face_vertices) >= 3:
-                    for i in range(1, len(face_vertices) - 1):
-                        triangles.append(Triangle(
-                            face_vertices[0],
-                            face_vertices[i],
-                            face_vertices[i + 1],
-                            current_color
-                        ))
-                    face_count += 1
-
-            # Progress indicator
-            if line_count % 50000 == 0:
-                print(f"  Processed {line_count} lines, {len(vertices)} vertices, {len(triangles)} triangles...")
-
-    print(f"  Total: {len(vertices)} vertices, {len(triangles)} triangles from {face_count} faces")
+                name_lower = name.lower()
+                material_skip[name] = bool(name) and any(excl in name_lower for excl in exclude_lower)
+            material_pos.append(pos)
+            material_index.append(palette[name])
+            material_excluded.append(material_skip[name])
+        else:
+            # Object name. Skip faces from non-included objects (if filter is set);
+            # use exact match (case-insensitive) to avoid partial matches
+            if name not in object_skip:
+                object_skip[name] = bool(include_lower) and bool(name) and name.lower() not in include_lower
+            object_pos.append(pos)
+            object_skipped.append(object_skip[name])
+
+    # State in effect at each face: the last record before it
+    face_material = np.searchsorted(material_pos, face_pos) - 1
+    face_object = np.searchsorted(object_pos, face_pos) - 1
+    keep = ~(np.array(material_excluded)[face_material] | np.array(object_skipped)[face_object])
+    excluded_count = len(face_lines) - int(np.count_nonzero(keep))
+    if excluded_count:
+        face_lines = [line for line, kept in zip(face_lines, keep.tolist()) if kept]
+    # Vertices defined before each face (what negative indices count back from) and its palette index
+    face_vertex_counts = np.searchsorted(vertex_pos, face_pos[keep])
+    face_materials = np.array(material_index, dtype=np.uint16)[face_material[keep]]
+
+    # Resolve face indices and triangulate (fan triangulation)
+    indices, face_ids = parse_face_lines(face_lines, face_vertex_counts)
+    i0, i1, i2, tri_faces = fan_triangulate(indices, face_ids, len(face_lines))
+    # tri_faces is sorted, so distinct faces are where it steps
+    face_count = np.count_nonzero(np.diff(tri_faces)) + 1 if len(tri_faces) else 0
+
+    print(f"  Total: {len(vertex_lines)} vertices, {len(i0)} triangles from {face_count} faces")
     if excluded_count > 0:
         print(f"  Excluded {excluded_count} faces from materials: {exclude_materials}")
 
     # Calculate bounding box
-    if not vertices:
+    if not vertex_lines:
         raise ValueError("No vertices found in OBJ file")
 
-    min_pt = Vec3(float('inf'), float('inf'), float('inf'))
-    max_pt = Vec3(float('-inf'), float('-inf'), float('-inf'))
-
-    for v in vertices:
-        min_pt.x = min(min_pt.x, v.x)
-        min_pt.y = min(min_pt.y, v.y)
-        min_pt.z = min(min_pt.z, v.z)
-        max_pt.x = max(max_pt.x, v.x)
-        max_pt.y = max(max_pt.y, v.y)
-        max_pt.z = max(max_pt.z, v.z)
-
-    bbox = BoundingBox(min_pt, max_pt)
-    print(f"  Bounding box: ({min_pt.x:.2f}, {min_pt.y:.2f}, {min_pt.z:.2f}) to ({max_pt.x:.2f}, {max_pt.y:.2f}, {max_pt.z:.2f})")
+    verts = parse_vertex_lines(vertex_lines)
+    bbox = bounding_box(verts)
+    min_pt, max_pt = bbox.min_pt, bbox.max_pt
+    print(f"  Bounding box: ({min_pt[0]:.2f}, {min_pt[1]:.2f}, {min_pt[2]:.2f}) to ({max_pt[0]:.2f}, {max_pt[1]:.2f}, {max_pt[2]:.2f})")
+
+    # Gather triangle corners from the vertex table
+    triangles = Triangles(
+        verts[i0],
+        verts[i1],
+        verts[i2],
+        face_materials[tri_faces],
+        np.array(palette_colors, dtype=np.uint8)
+    )
 
     return triangles, bbox
 
 
-def triangle_aabb_intersect(tri: Triangle, box_center: Vec3, box_half: Vec3) -> bool:
-    """Check if a triangle intersects an axis-aligned bounding box."""
-    # Translate triangle to box center
-    v0 = tri.v0 - box_center
-    v1 = tri.v1 - box_center
-    v2 = tri.v2 - box_center
-
-    # Edge vectors
-    e0 = v1 - v0
-    e1 = v2 - v1
-    e2 = v0 - v2
+@njit(cache=True)
+def _edge_axes_separate(ex: float, ey: float, ez: float,
+                        v0x: float, v0y: float, v0z: float,
+                        v1x: float, v1y: float, v1z: float,
+                        v2x: float, v2y: float, v2z: float, h: float) -> bool:
+    """
+    Test the 3 separating axes formed by crossing edge e with the box normals.
+    An axis separates when the triangle's projection [min p, max p] misses [-r, r];
+    both bounds are compared unconditionally so the JIT can evaluate them without branching.
+    """
+    # e x X = (0, -ez, ey)
+    p0 = -ez * v0y + ey * v0z
+    p1 = -ez * v1y + ey * v1z
+    p2 = -ez * v2y + ey * v2z
+    r = h * abs(ez) + h * abs(ey)
+    if (max(p0, p1, p2) < -r) | (min(p0, p1, p2) > r):
+        return True
+
+    # e x Y = (ez, 0, -ex)
+    p0 = ez * v0x + -ex * v0z
+    p1 = ez * v1x + -ex * v1z
+    p2 = ez * v2x + -ex * v2z
+    r = h * abs(ez) + h * abs(ex)
+    if (max(p0, p1, p2) < -r) | (min(p0, p1, p2) > r):
+        return True
+
+    # e x Z = (-ey, ex, 0)
+    p0 = -ey * v0x + ex * v0y
+    p1 = -ey * v1x + ex * v1y
+    p2 = -ey * v2x + ex * v2y
+    r = h * abs(ey) + h * abs(ex)
+    if (max(p0, p1, p2) < -r) | (min(p0, p1, p2) > r):
+        return True
+
+    return False
+
+
+def triangle_edges(triangles: Triangles) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Return the (N, 3, 3) edge vectors v1-v0, v2-v1, v0-v2 and the (N, 3) normals
+    of all triangles. These depend only on the triangle, so they are computed once
+    here rather than for every cell tested.
+    """
+    edges = np.stack([triangles.v1 - triangles.v0,
+                      triangles.v2 - triangles.v1,
+                      triangles.v0 - triangles.v2], axis=1)
+    normals = np.cross(edges[:, 0], edges[:, 1])
+    return edges, normals
+
+
+@njit(cache=True)
+def plane_box_overlap(a: np.ndarray, normal: np.ndarray,
+                      cx: float, cy: float, cz: float, h: float) -> bool:
+    """Check if the plane through a with the given normal passes through the cube at (cx, cy, cz)."""
+    nx, ny, nz = normal[0], normal[1], normal[2]
+    d = nx * (a[0] - cx) + ny * (a[1] - cy) + nz * (a[2] - cz)
+    r = h * abs(nx) + h * abs(ny) + h * abs(nz)
+    return abs(d) <= r
+
+
+@njit(cache=True)
+def triangle_aabb_intersect(ax: float, ay: float, az: float,
+                            bx: float, by: float, bz: float,
+                            cx: float, cy: float, cz: float,
+                            e0x: float, e0y: float, e0z: float,
+                            e1x: float, e1y: float, e1z: float,
+                            e2x: float, e2y: float, e2z: float,
+                            nx: float, ny: float, nz: float,
+                            px: float, py: float, pz: float, h: float) -> bool:
+    """
+    Check if triangle (a, b, c) intersects the cube centered at (px, py, pz) with half-size h.
+    e0..e2 and n are the triangle's edges and normal from triangle_edges. Everything
+    is passed as scalars so a caller looping over cells can load the triangle once
+    and keep it in registers; array rows would be re-read for every cell, since the
+    compiler can't prove the cell writes don't alias them.
+    Tests run cheapest and most selective first: the triangle plane, the box
+    faces, then the 9 edge axes.
+    """
+    # Test triangle normal
+    d = nx * (ax - px) + ny * (ay - py) + nz * (az - pz)
+    r = h * abs(nx) + h * abs(ny) + h * abs(nz)
+    if not abs(d) <= r:
+        return False
 
-    # Test the 9 separating axes from cross products of edges with box normals
-    axes = [
-        Vec3(0, -e0.z, e0.y), Vec3(0, -e1.z, e1.y), Vec3(0, -e2.z, e2.y),
-        Vec3(e0.z, 0, -e0.x), Vec3(e1.z, 0, -e1.x), Vec3(e2.z, 0, -e2.x),
-        Vec3(-e0.y, e0.x, 0), Vec3(-e1.y, e1.x, 0), Vec3(-e2.y, e2.x, 0)
-    ]
-
-    for axis in axes:
-        p0 = axis.dot(v0)
-        p1 = axis.dot(v1)
-        p2 = axis.dot(v2)
-        r = box_half.x * abs(axis.x) + box_half.y * abs(axis.y) + box_half.z * abs(axis.z)
-        if max(-max(p0, p1, p2), min(p0, p1, p2)) > r:
-            return False
+    # Translate triangle to box center
+    v0x = ax - px
+    v0y = ay - py
+    v0z = az - pz
+    v1x = bx - px
+    v1y = by - py
+    v1z = bz - pz
+    v2x = cx - px
+    v2y = cy - py
+    v2z = cz - pz
 
     # Test the 3 box face normals
-    if max(v0.x, v1.x, v2.x) < -box_half.x or min(v0.x, v1.x, v2.x) > box_half.x:
+    if max(v0x, v1x, v2x) < -h or min(v0x, v1x, v2x) > h:
         return False
-    if max(v0.y, v1.y, v2.y) < -box_half.y or min(v0.y, v1.y, v2.y) > box_half.y:
+    if max(v0y, v1y, v2y) < -h or min(v0y, v1y, v2y) > h:
         return False
-    if max(v0.z, v1.z, v2.z) < -box_half.z or min(v0.z, v1.z, v2.z) > box_half.z:
+    if max(v0z, v1z, v2z) < -h or min(v0z, v1z, v2z) > h:
         return False
 
-    # Test triangle normal
-    normal = e0.cross(e1)
-    d = normal.dot(v0)
-    r = box_half.x * abs(normal.x) + box_half.y * abs(normal.y) + box_half.z * abs(normal.z)
-    if abs(d) > r:
+    # Test the 9 separating axes from cross products of edges with box normals
+    if _edge_axes_separate(e0x, e0y, e0z, v0x, v0y, v0z, v1x, v1y, v1z, v2x, v2y, v2z, h):
+        return False
+    if _edge_axes_separate(e1x, e1y, e1z, v0x, v0y, v0z, v1x, v1y, v1z, v2x, v2y, v2z, h):
+        return False
+    if _edge_axes_separate(e2x, e2y, e2z, v0x, v0y, v0z, v1x, v1y, v1z, v2x, v2y, v2z, h):
         return False
 
     return True
 
 
-def hollow_out(voxels: dict, grid_size: tuple) -> dict:
-    """Remove interior voxels, keeping only the shell/surface."""
-    print("Hollowing out interior voxels...")
+def _edge_axes_separate_batch(e: np.ndarray, v0: np.ndarray, v1: np.ndarray, v2: np.ndarray,
+                              h: float) -> np.ndarray:
+    """Batched _edge_axes_separate for (K, 3) translated corners; returns a (K,) mask."""
+    ex, ey, ez = e.tolist()
+    separated = np.zeros(len(v0), dtype=bool)
+    # e x X, e x Y, e x Z as (coefficient, component) pairs
+    for ca, i, cb, j in ((-ez, 1, ey, 2), (ez, 0, -ex, 2), (-ey, 0, ex, 1)):
+        p0 = ca * v0[:, i] + cb * v0[:, j]
+        p1 = ca * v1[:, i] + cb * v1[:, j]
+        p2 = ca * v2[:, i] + cb * v2[:, j]
+        r = h * abs(ca) + h * abs(cb)
+        separated |= (np.maximum(np.maximum(p0, p1), p2) < -r) | (np.minimum(np.minimum(p0, p1), p2) > r)
+    return separated
+
+
+def triangle_aabb_intersect_batch(a: np.ndarray, b: np.ndarray, c: np.ndarray,
+                                  edges: np.ndarray, normal: np.ndarray,
+                                  centers: np.ndarray, h: float) -> np.ndarray:
+    """
+    Vectorized triangle_aabb_intersect: test one triangle against the cubes at
+    (K, 3) centers and return a (K,) mask. The expressions match the scalar
+    version term for term, so both give bit-identical answers.
+    """
+    v0 = a - centers
+    v1 = b - centers
+    v2 = c - centers
 
-    grid_x, grid_y, grid_z = grid_size
-    surface_voxels = {}
+    # Triangle normal
+    nx, ny, nz = normal.tolist()
+    d = nx * v0[:, 0] + ny * v0[:, 1] + nz * v0[:, 2]
+    hit = np.abs(d) <= h * abs(nx) + h * abs(ny) + h * abs(nz)
 
-    # A voxel is on the surface if at least one neighbor is empty
-    directions = [
-        (1, 0, 0), (-1, 0, 0),
-        (0, 1, 0), (0, -1, 0),
-        (0, 0, 1), (0, 0, -1)
-    ]
+    # Box face normals
+    lo = np.minimum(np.minimum(v0, v1), v2)
+    hi = np.maximum(np.maximum(v0, v1), v2)
+    hit &= ((hi >= -h) & (lo <= h)).all(axis=1)
 
-    for (vx, vy, vz), color in voxels.items():
-        is_surface = False
+    # Edge x box normal axes
+    for e in edges:
+        hit &= ~_edge_axes_separate_batch(e, v0, v1, v2, h)
+    return hit
 
-        for dx, dy, dz in directions:
-            neighbor = (vx + dx, vy + dy, vz + dz)
-            # If neighbor is outside bounds or empty, this is a surface voxel
-            if neighbor not in voxels:
-                is_surface = True
+
+def _rasterize_batched(triangles: Triangles, edges: np.ndarray, normals: np.ndarray,
+                       cell_min: np.ndarray, cell_max: np.ndarray, origin: np.ndarray,
+                       cell_size: float, grid: np.ndarray) -> None:
+    """
+    NumPy stand-in for _rasterize_tiles when Numba isn't installed. Each triangle
+    is tested against all still-empty cells of its bounding box in one batched
+    call; triangles go in order, so the lowest-index one still wins each cell.
+    """
+    h = cell_size / 2
+    values = triangles.material + 1
+    for t in range(len(triangles)):
+        lo = cell_min[t]
+        x0, y0, z0 = lo.tolist()
+        x1, y1, z1 = (cell_max[t] + 1).tolist()
+        box = grid[x0:x1, y0:y1, z0:z1]
+        cells = np.argwhere(box == 0)
+        if len(cells) == 0:
+            continue
+        centers = origin + ((cells + lo) + 0.5) * cell_size
+        hit = triangle_aabb_intersect_batch(triangles.v0[t], triangles.v1[t], triangles.v2[t],
+                                            edges[t], normals[t], centers, h)
+        box[tuple(cells[hit].T)] = values[t]
+
+
+def _rasterize_shard(shm_name: str, grid_dims: tuple, triangles: Triangles,
+                     edges: np.ndarray, normals: np.ndarray, cell_min: np.ndarray,
+                     cell_max: np.ndarray, origin: np.ndarray, cell_size: float) -> None:
+    """Worker for _rasterize_sharded: run _rasterize_batched on the shared grid."""
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        grid = np.ndarray(grid_dims, dtype=np.uint16, buffer=shm.buf)
+        _rasterize_batched(triangles, edges, normals, cell_min, cell_max, origin, cell_size, grid)
+        del grid
+    finally:
+        shm.close()
+
+
+def _rasterize_sharded(triangles: Triangles, edges: np.ndarray, normals: np.ndarray,
+                       cell_min: np.ndarray, cell_max: np.ndarray, origin: np.ndarray,
+                       cell_size: float, grid: np.ndarray, workers: int) -> None:
+    """
+    Run _rasterize_batched across worker processes, one x-slab of the grid each.
+    Every worker gets the triangles overlapping its slab, in file order, with their
+    cell bounds clipped to the slab, and writes straight into a shared copy of the
+    grid. Slabs are disjoint, so no merge is needed and the lowest-index triangle
+    still wins each cell.
+    """
+    shm = shared_memory.SharedMemory(create=True, size=grid.nbytes)
+    try:
+        shared = np.ndarray(grid.shape, dtype=grid.dtype, buffer=shm.buf)
+        shared[...] = grid
+        bounds = np.linspace(0, grid.shape[0], workers + 1).astype(np.int64)
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = []
+            for x0, x1 in zip(bounds[:-1].tolist(), bounds[1:].tolist()):
+                sel = np.flatnonzero((cell_min[:, 0] < x1) & (cell_max[:, 0] >= x0))
+                if x0 == x1 or len(sel) == 0:
+                    continue
+                shard_min = cell_min[sel]
+                shard_max = cell_max[sel]
+                shard_min[:, 0] = np.maximum(shard_min[:, 0], x0)
+                shard_max[:, 0] = np.minimum(shard_max[:, 0], x1 - 1)
+                shard = Triangles(triangles.v0[sel], triangles.v1[sel], triangles.v2[sel],
+                                  triangles.material[sel], triangles.palette)
+                futures.append(pool.submit(_rasterize_shard, shm.name, grid.shape, shard,
+                                           edges[sel], normals[sel], shard_min, shard_max,
+                                           origin, cell_size))
+            for future in futures:
+                future.result()
+        grid[...] = shared
+        del shared
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+@njit(cache=True, parallel=True)
+def _prepare_triangles(v0: np.ndarray, v1: np.ndarray, v2: np.ndarray, material: np.ndarray,
+                       slots: np.ndarray, origin: np.ndarray, cell_size: float,
+                       grid_dims: tuple) -> Tuple[np.ndarray, ...]:
+    """
+    Compiled counterpart of triangle_edges and triangle_cell_bounds. Computes every
+    triangle's edges, normal, grid value and inclusive cell range in one parallel
+    pass, writing triangle t's results (and its corners) to row slots[t].
+    Returns (a, b, c, edges, normals, values, cell_min, cell_max).
+    """
+    n = len(slots)
+    a = np.empty((n, 3))
+    b = np.empty((n, 3))
+    c = np.empty((n, 3))
+    edges = np.empty((n, 3, 3))
+    normals = np.empty((n, 3))
+    values = np.empty(n, dtype=np.uint16)
+    cell_min = np.empty((n, 3), dtype=np.int64)
+    cell_max = np.empty((n, 3), dtype=np.int64)
+    for t in prange(n):
+        s = slots[t]
+        for i in range(3):
+            a[s, i] = v0[t, i]
+            b[s, i] = v1[t, i]
+            c[s, i] = v2[t, i]
+            edges[s, 0, i] = v1[t, i] - v0[t, i]
+            edges[s, 1, i] = v2[t, i] - v1[t, i]
+            edges[s, 2, i] = v0[t, i] - v2[t, i]
+            lo = min(min(v0[t, i], v1[t, i]), v2[t, i])
+            hi = max(max(v0[t, i], v1[t, i]), v2[t, i])
+            cell_min[s, i] = max(np.int64((lo - origin[i]) / cell_size), 0)
+            cell_max[s, i] = min(np.int64((hi - origin[i]) / cell_size), grid_dims[i] - 1)
+        e0 = edges[s, 0]
+        e1 = edges[s, 1]
+        normals[s, 0] = e0[1] * e1[2] - e0[2] * e1[1]
+        normals[s, 1] = e0[2] * e1[0] - e0[0] * e1[2]
+        normals[s, 2] = e0[0] * e1[1] - e0[1] * e1[0]
+        values[s] = material[t] + 1
+    return a, b, c, edges, normals, values, cell_min, cell_max
+
+
+@njit(cache=True)
+def _bin_triangles(v0: np.ndarray, normals: np.ndarray, cell_min: np.ndarray, cell_max: np.ndarray,
+                   origin: np.ndarray, cell_size: float, tile_dims: tuple,
+                   slots: np.ndarray, capacity: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Build a CSR index from TILE_SIZE^3 tiles of the grid to candidate triangles: tile
+    k's candidates are tri_ids[offsets[k]:offsets[k + 1]], listed in ascending triangle
+    order and stored as slots[t], the triangle's row in the per-triangle arrays (laid
+    out in slot order by _prepare_triangles).
+    A triangle is registered in the tiles of its bounding box that its plane passes
+    through, so large slanted triangles skip tiles they can never touch. The
+    (tile, triangle) pairs are gathered in one pass, into buffers of capacity pairs
+    (at least the total number of bounding-box tiles), then grouped by tile with a
+    counting sort, which keeps every tile's list in triangle order.
+    """
+    tiles_x, tiles_y, tiles_z = tile_dims
+    tile_size = TILE_SIZE * cell_size
+    # Tile box plus half a cell of slack, so rounding can't drop a tile a cell test would pass
+    h = (TILE_SIZE + 1) * cell_size / 2
+    pair_tiles = np.empty(capacity, dtype=np.int64)
+    pair_ids = np.empty(capacity, dtype=np.int32)
+    n = 0
+    for t in range(len(slots)):
+        s = slots[t]
+        for x in range(cell_min[s, 0] // TILE_SIZE, cell_max[s, 0] // TILE_SIZE + 1):
+            cx = origin[0] + (x + 0.5) * tile_size
+            for y in range(cell_min[s, 1] // TILE_SIZE, cell_max[s, 1] // TILE_SIZE + 1):
+                cy = origin[1] + (y + 0.5) * tile_size
+                for z in range(cell_min[s, 2] // TILE_SIZE, cell_max[s, 2] // TILE_SIZE + 1):
+                    cz = origin[2] + (z + 0.5) * tile_size
+                    if plane_box_overlap(v0[s], normals[s], cx, cy, cz, h):
+                        pair_tiles[n] = (x * tiles_y + y) * tiles_z + z
+                        pair_ids[n] = s
+                        n += 1
+
+    counts = np.zeros(tiles_x * tiles_y * tiles_z + 1, dtype=np.int64)
+    for i in range(n):
+        counts[pair_tiles[i] + 1] += 1
+    offsets = np.cumsum(counts)
+
+    cursor = offsets[:-1].copy()
+    tri_ids = np.empty(n, dtype=np.int32)
+    for i in range(n):
+        k = pair_tiles[i]
+        tri_ids[cursor[k]] = pair_ids[i]
+        cursor[k] += 1
+    return offsets, tri_ids
+
+
+@njit(cache=True)
+def _fill_axis_aligned(local: np.ndarray, axis: int, a: np.ndarray, b: np.ndarray, c: np.ndarray,
+                       edges: np.ndarray, origin: np.ndarray, cell_size: float,
+                       tile_origin: tuple, box_lo: tuple, box_hi: tuple, value: int) -> int:
+    """
+    Fast path of _rasterize_tiles for a triangle whose corners share one coordinate
+    exactly, i.e. that lies in a plane perpendicular to axis. Its edges and normal
+    are then exactly zero along that axis, and the SAT collapses: the plane test and
+    the 6 edge axes that don't involve the plane's own normal can only fail when a
+    box face test fails too. What remains is the 3 box face tests, which split by
+    axis and are evaluated once per row of cells, and the 3 edge axes that form a 2D
+    edge test in the plane. Results match triangle_aabb_intersect bit for bit.
+    Fills the empty cells of local[box_lo:box_hi] that the triangle touches with value
+    and returns how many were set.
+    """
+    h = cell_size / 2
+    # Box face test of every cell row along each axis
+    face_ok = np.zeros((3, TILE_SIZE), dtype=np.bool_)
+    for i in range(3):
+        for k in range(box_lo[i], box_hi[i]):
+            p = origin[i] + (tile_origin[i] + k + 0.5) * cell_size
+            d0 = a[i] - p
+            d1 = b[i] - p
+            d2 = c[i] - p
+            face_ok[i, k] = not (max(d0, d1, d2) < -h or min(d0, d1, d2) > h)
+
+    # In-plane axes, ordered so the edge test below matches _edge_axes_separate term for term
+    u = (axis + 1) % 3
+    v = (axis + 2) % 3
+    e0u, e0v = edges[0, u], edges[0, v]
+    e1u, e1v = edges[1, u], edges[1, v]
+    e2u, e2v = edges[2, u], edges[2, v]
+    r0 = h * abs(e0v) + h * abs(e0u)
+    r1 = h * abs(e1v) + h * abs(e1u)
+    r2 = h * abs(e2v) + h * abs(e2u)
+
+    count = 0
+    for layer in range(box_lo[axis], box_hi[axis]):
+        if not face_ok[axis, layer]:
+            continue
+        for i in range(box_lo[u], box_hi[u]):
+            if not face_ok[u, i]:
+                continue
+            pu = origin[u] + (tile_origin[u] + i + 0.5) * cell_size
+            u0 = a[u] - pu
+            u1 = b[u] - pu
+            u2 = c[u] - pu
+            for j in range(box_lo[v], box_hi[v]):
+                if not face_ok[v, j]:
+                    continue
+                if axis == 0:
+                    x, y, z = layer, i, j
+                elif axis == 1:
+                    x, y, z = j, layer, i
+                else:
+                    x, y, z = i, j, layer
+                if local[x, y, z] != 0:
+                    continue
+                pv = origin[v] + (tile_origin[v] + j + 0.5) * cell_size
+                v0 = a[v] - pv
+                v1 = b[v] - pv
+                v2 = c[v] - pv
+                p0 = -e0v * u0 + e0u * v0
+                p1 = -e0v * u1 + e0u * v1
+                p2 = -e0v * u2 + e0u * v2
+                if (max(p0, p1, p2) < -r0) | (min(p0, p1, p2) > r0):
+                    continue
+                p0 = -e1v * u0 + e1u * v0
+                p1 = -e1v * u1 + e1u * v1
+                p2 = -e1v * u2 + e1u * v2
+                if (max(p0, p1, p2) < -r1) | (min(p0, p1, p2) > r1):
+                    continue
+                p0 = -e2v * u0 + e2u * v0
+                p1 = -e2v * u1 + e2u * v1
+                p2 = -e2v * u2 + e2u * v2
+                if (max(p0, p1, p2) < -r2) | (min(p0, p1, p2) > r2):
+                    continue
+                local[x, y, z] = value
+                count += 1
+    return count
+
+
+@njit(cache=True, parallel=True)
+def _rasterize_tiles(v0: np.ndarray, v1: np.ndarray, v2: np.ndarray,
+                     edges: np.ndarray, normals: np.ndarray, values: np.ndarray,
+                     cell_min: np.ndarray, cell_max: np.ndarray,
+                     offsets: np.ndarray, tri_ids: np.ndarray, origin: np.ndarray,
+                     cell_size: float, grid: np.ndarray) -> None:
+    """
+    Give every grid cell the value of the first candidate triangle that intersects it.
+    Each tile is filled in a small local buffer that stays in cache while its
+    triangles are tested, then copied to the grid. Candidates are visited in triangle
+    order and a filled cell is never retested, so the lowest-index triangle touching
+    a cell keeps it. A triangle whose box within the tile is already fully set is
+    skipped without visiting its cells, and a tile stops taking triangles once every
+    cell in it is set. Axis-aligned triangles go through _fill_axis_aligned; others
+    only visit the cells near their plane. Tiles are disjoint, so they are split across threads without
+    locks and the result doesn't depend on scheduling.
+    """
+    h = cell_size / 2
+    grid_x, grid_y, grid_z = grid.shape
+    tiles_y = (grid_y + TILE_SIZE - 1) // TILE_SIZE
+    tiles_z = (grid_z + TILE_SIZE - 1) // TILE_SIZE
+    tiles = np.flatnonzero(offsets[1:] != offsets[:-1])
+    for i in prange(len(tiles)):
+        k = tiles[i]
+        x0 = k // (tiles_y * tiles_z) * TILE_SIZE
+        y0 = k // tiles_z % tiles_y * TILE_SIZE
+        z0 = k % tiles_z * TILE_SIZE
+        x1 = min(x0 + TILE_SIZE, grid_x)
+        y1 = min(y0 + TILE_SIZE, grid_y)
+        z1 = min(z0 + TILE_SIZE, grid_z)
+
+        local = np.zeros((TILE_SIZE, TILE_SIZE, TILE_SIZE), dtype=grid.dtype)
+        unset = (x1 - x0) * (y1 - y0) * (z1 - z0)
+        for j in range(offsets[k], offsets[k + 1]):
+            if unset == 0:
                 break
+            t = tri_ids[j]
+            # Triangle's cell range, relative to the tile
+            ax = max(cell_min[t, 0], x0) - x0
+            bx = min(cell_max[t, 0] + 1, x1) - x0
+            ay = max(cell_min[t, 1], y0) - y0
+            by = min(cell_max[t, 1] + 1, y1) - y0
+            az = max(cell_min[t, 2], z0) - z0
+            bz = min(cell_max[t, 2] + 1, z1) - z0
+            if np.all(local[ax:bx, ay:by, az:bz]):
+                continue
 
-        if is_surface:
-            surface_voxels[(vx, vy, vz)] = color
+            # Load the triangle once, outside the cell loops
+            pax, pay, paz = v0[t, 0], v0[t, 1], v0[t, 2]
+            pbx, pby, pbz = v1[t, 0], v1[t, 1], v1[t, 2]
+            pcx, pcy, pcz = v2[t, 0], v2[t, 1], v2[t, 2]
+
+            # Triangles in an axis-aligned plane (common in architectural and
+            # low-poly models) take the cheaper planar test
+            axis = -1
+            if pax == pbx and pax == pcx:
+                axis = 0
+            elif pay == pby and pay == pcy:
+                axis = 1
+            elif paz == pbz and paz == pcz:
+                axis = 2
+            if axis >= 0:
+                unset -= _fill_axis_aligned(local, axis, v0[t], v1[t], v2[t], edges[t], origin,
+                                            cell_size, (x0, y0, z0), (ax, ay, az), (bx, by, bz),
+                                            values[t])
+                continue
+
+            e0x, e0y, e0z = edges[t, 0, 0], edges[t, 0, 1], edges[t, 0, 2]
+            e1x, e1y, e1z = edges[t, 1, 0], edges[t, 1, 1], edges[t, 1, 2]
+            e2x, e2y, e2z = edges[t, 2, 0], edges[t, 2, 1], edges[t, 2, 2]
+            nx, ny, nz = normals[t, 0], normals[t, 1], normals[t, 2]
+            value = values[t]
+
+            # Walk cell columns along the axis the normal is largest on. Only cells
+            # whose centers lie within half the plane test's slab width of the
+            # plane (at most 1.5 cells) can pass, so each column visits that
+            # stretch plus a cell of margin for rounding instead of the whole box.
+            axis = 0
+            if abs(ny) > abs(nx):
+                axis = 1
+            if abs(nz) > max(abs(nx), abs(ny)):
+                axis = 2
+            u = (axis + 1) % 3
+            v = (axis + 2) % 3
+            nk, nu, nv = normals[t, axis], normals[t, u], normals[t, v]
+            box_lo = (ax, ay, az)
+            box_hi = (bx, by, bz)
+            tile_origin = (x0, y0, z0)
+            # Bounding a column only pays off when the box is deeper than the
+            # bounded stretch; degenerate (zero-area) triangles have no plane to bound it
+            bounded = box_hi[axis] - box_lo[axis] > 5 and nk != 0
+            half = (abs(nx) + abs(ny) + abs(nz)) / (2 * abs(nk)) if bounded else 0.0
+            for iu in range(box_lo[u], box_hi[u]):
+                pu = origin[u] + (tile_origin[u] + iu + 0.5) * cell_size
+                du = nu * (v0[t, u] - pu)
+                for iv in range(box_lo[v], box_hi[v]):
+                    pv = origin[v] + (tile_origin[v] + iv + 0.5) * cell_size
+                    k_lo, k_hi = box_lo[axis], box_hi[axis]
+                    if bounded:
+                        # Where the plane crosses this column, in tile cells along the axis
+                        kc = ((v0[t, axis] + (du + nv * (v0[t, v] - pv)) / nk - origin[axis]) / cell_size
+                              - tile_origin[axis] - 0.5)
+                        k_lo = max(k_lo, int(math.floor(kc - half)) - 1)
+                        k_hi = min(k_hi, int(math.ceil(kc + half)) + 2)
+                    for ik in range(k_lo, k_hi):
+                        if axis == 0:
+                            x, y, z = ik, iu, iv
+                            px, py, pz = origin[0] + (x0 + ik + 0.5) * cell_size, pu, pv
+                        elif axis == 1:
+                            x, y, z = iv, ik, iu
+                            px, py, pz = pv, origin[1] + (y0 + ik + 0.5) * cell_size, pu
+                        else:
+                            x, y, z = iu, iv, ik
+                            px, py, pz = pu, pv, origin[2] + (z0 + ik + 0.5) * cell_size
+                        if local[x, y, z] != 0:
+                            continue
+                        if triangle_aabb_intersect(pax, pay, paz, pbx, pby, pbz, pcx, pcy, pcz,
+                                                   e0x, e0y, e0z, e1x, e1y, e1z, e2x, e2y, e2z,
+                                                   nx, ny, nz, px, py, pz, h):
+                            local[x, y, z] = value
+                            unset -= 1
+        grid[x0:x1, y0:y1, z0:z1] = local[:x1 - x0, :y1 - y0, :z1 - z0]
+
+
+def hollow_out(grid: np.ndarray) -> np.ndarray:
+    """Remove interior voxels from a voxel grid, keeping only the shell/surface."""
+    print("Hollowing out interior voxels...")
 
-    removed = len(voxels) - len(surface_voxels)
-    print(f"  Removed {removed} interior voxels, {len(surface_voxels)} surface voxels remain")
-    return surface_voxels
+    # A voxel is on the surface if at least one of its 6 neighbors is empty
+    # (cells outside the grid count as empty)
+    occupied = np.pad(grid != 0, 1)
+    interior = (occupied[2:, 1:-1, 1:-1] & occupied[:-2, 1:-1, 1:-1] &
+                occupied[1:-1, 2:, 1:-1] & occupied[1:-1, :-2, 1:-1] &
+                occupied[1:-1, 1:-1, 2:] & occupied[1:-1, 1:-1, :-2])
+    surface = np.where(interior, 0, grid).astype(grid.dtype)
 
+    surface_count = int(np.count_nonzero(surface))
+    removed = int(np.count_nonzero(grid)) - surface_count
+    print(f"  Removed {removed} interior voxels, {surface_count} surface voxels remain")
+    return surface
 
-def voxelize(triangles: List[Triangle], bbox: BoundingBox, resolution: int) -> List[dict]:
-    """Convert triangles to voxels."""
+
+def triangle_cell_bounds(triangles: Triangles, bbox: BoundingBox, cell_size: float,
+                         grid_dims: tuple) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Return the inclusive (N, 3) min and max cell indices of every triangle's
+    bounding box on a grid of cell_size cells anchored at bbox.min_pt.
+    """
+    origin = bbox.min_pt
+    tri_min = np.minimum(np.minimum(triangles.v0, triangles.v1), triangles.v2)
+    tri_max = np.maximum(np.maximum(triangles.v0, triangles.v1), triangles.v2)
+    cell_min = np.maximum(((tri_min - origin) / cell_size).astype(np.int64), 0)
+    cell_max = np.minimum(((tri_max - origin) / cell_size).astype(np.int64), np.array(grid_dims) - 1)
+    return cell_min, cell_max
+
+
+def _spread_bits(v: np.ndarray) -> np.ndarray:
+    """Spread the low 21 bits of each value so two zero bits follow each bit."""
+    v = v.astype(np.uint64) & 0x1FFFFF
+    v = (v | (v << 32)) & 0x1F00000000FFFF
+    v = (v | (v << 16)) & 0x1F0000FF0000FF
+    v = (v | (v << 8)) & 0x100F00F00F00F00F
+    v = (v | (v << 4)) & 0x10C30C30C30C30C3
+    v = (v | (v << 2)) & 0x1249249249249249
+    return v
+
+
+def morton_encode(cells: np.ndarray) -> np.ndarray:
+    """Return the 63-bit Morton (Z-order) code of each (N, 3) row of non-negative cell indices."""
+    return (_spread_bits(cells[:, 0]) << 2) | (_spread_bits(cells[:, 1]) << 1) | _spread_bits(cells[:, 2])
+
+
+# CUDA version of triangle_aabb_intersect, one thread per (triangle, cell) pair.
+# Pairs are numbered triangle by triangle through each triangle's cell box, and
+# offsets[t] is the first pair of triangle t. Each thread records the lowest
+# triangle index that hits its cell with atomicMin, so the first triangle wins
+# no matter how threads are scheduled. Compiled with --fmad=false so every
+# product and sum rounds exactly like the CPU code.
+_GPU_KERNEL_SOURCE = r'''
+__device__ bool edge_axes_separate(double ex, double ey, double ez,
+                                   double v0x, double v0y, double v0z,
+                                   double v1x, double v1y, double v1z,
+                                   double v2x, double v2y, double v2z, double h)
+{
+    double p0, p1, p2, r;
+    p0 = -ez * v0y + ey * v0z;
+    p1 = -ez * v1y + ey * v1z;
+    p2 = -ez * v2y + ey * v2z;
+    r = h * fabs(ez) + h * fabs(ey);
+    if (fmax(fmax(p0, p1), p2) < -r || fmin(fmin(p0, p1), p2) > r) return true;
+
+    p0 = ez * v0x + -ex * v0z;
+    p1 = ez * v1x + -ex * v1z;
+    p2 = ez * v2x + -ex * v2z;
+    r = h * fabs(ez) + h * fabs(ex);
+    if (fmax(fmax(p0, p1), p2) < -r || fmin(fmin(p0, p1), p2) > r) return true;
+
+    p0 = -ey * v0x + ex * v0y;
+    p1 = -ey * v1x + ex * v1y;
+    p2 = -ey * v2x + ex * v2y;
+    r = h * fabs(ey) + h * fabs(ex);
+    if (fmax(fmax(p0, p1), p2) < -r || fmin(fmin(p0, p1), p2) > r) return true;
+
+    return false;
+}
+
+extern "C" __global__
+void rasterize_pairs(const double* a, const double* b, const double* c,
+                     const long long* cell_min, const long long* box_dims,
+                     const long long* offsets, int first_tri, int n_tris, long long n_pairs,
+                     double ox, double oy, double oz, double cell_size,
+                     int grid_y, int grid_z, int* owner)
+{
+    long long i = (long long)blockIdx.x * blockDim.x + threadIdx.x;
+    if (i >= n_pairs) return;
+
+    // Triangle t of this batch with offsets[t] <= i < offsets[t + 1]
+    int lo = 0, hi = n_tris;
+    while (hi - lo > 1) {
+        int mid = (lo + hi) / 2;
+        if (offsets[mid] <= i) lo = mid; else hi = mid;
+    }
+    int t = lo;
+    int tri = first_tri + t;
+
+    long long k = i - offsets[t];
+    long long dy = box_dims[3 * t + 1], dz = box_dims[3 * t + 2];
+    long long x = cell_min[3 * t + 0] + k / (dy * dz);
+    long long y = cell_min[3 * t + 1] + k / dz % dy;
+    long long z = cell_min[3 * t + 2] + k % dz;
+    long long cell = (x * grid_y + y) * grid_z + z;
+    if (owner[cell] < tri) return;
+
+    double h = cell_size / 2;
+    double px = ox + (x + 0.5) * cell_size;
+    double py = oy + (y + 0.5) * cell_size;
+    double pz = oz + (z + 0.5) * cell_size;
+
+    double ax = a[3 * t], ay = a[3 * t + 1], az = a[3 * t + 2];
+    double bx = b[3 * t], by = b[3 * t + 1], bz = b[3 * t + 2];
+    double cx = c[3 * t], cy = c[3 * t + 1], cz = c[3 * t + 2];
+    double e0x = bx - ax, e0y = by - ay, e0z = bz - az;
+    double e1x = cx - bx, e1y = cy - by, e1z = cz - bz;
+    double e2x = ax - cx, e2y = ay - cy, e2z = az - cz;
+    double nx = e0y * e1z - e0z * e1y;
+    double ny = e0z * e1x - e0x * e1z;
+    double nz = e0x * e1y - e0y * e1x;
+
+    // Triangle plane
+    double d = nx * (ax - px) + ny * (ay - py) + nz * (az - pz);
+    if (!(fabs(d) <= h * fabs(nx) + h * fabs(ny) + h * fabs(nz))) return;
+
+    // Box faces
+    double v0x = ax - px, v0y = ay - py, v0z = az - pz;
+    double v1x = bx - px, v1y = by - py, v1z = bz - pz;
+    double v2x = cx - px, v2y = cy - py, v2z = cz - pz;
+    if (fmax(fmax(v0x, v1x), v2x) < -h || fmin(fmin(v0x, v1x), v2x) > h) return;
+    if (fmax(fmax(v0y, v1y), v2y) < -h || fmin(fmin(v0y, v1y), v2y) > h) return;
+    if (fmax(fmax(v0z, v1z), v2z) < -h || fmin(fmin(v0z, v1z), v2z) > h) return;
+
+    // Edge x box normal axes
+    if (edge_axes_separate(e0x, e0y, e0z, v0x, v0y, v0z, v1x, v1y, v1z, v2x, v2y, v2z, h)) return;
+    if (edge_axes_separate(e1x, e1y, e1z, v0x, v0y, v0z, v1x, v1y, v1z, v2x, v2y, v2z, h)) return;
+    if (edge_axes_separate(e2x, e2y, e2z, v0x, v0y, v0z, v1x, v1y, v1z, v2x, v2y, v2z, h)) return;
+
+    atomicMin(&owner[cell], tri);
+}
+'''
+
+_gpu_kernel = None
+
+
+def gpu_available() -> bool:
+    """Return whether CuPy is installed and can see a CUDA device."""
+    if cupy is None:
+        return False
+    try:
+        return cupy.cuda.runtime.getDeviceCount() > 0
+    except cupy.cuda.runtime.CUDARuntimeError:
+        return False
+
+
+def rasterize_triangles_gpu(triangles: Triangles, bbox: BoundingBox, cell_size: float,
+                            grid_dims: tuple) -> np.ndarray:
+    """
+    CuPy counterpart of rasterize_triangles, producing the same grid. Every
+    (triangle, cell) pair of the triangles' bounding boxes is tested by its own GPU
+    thread, in launches of at most GPU_BATCH_PAIRS pairs; each cell keeps the
+    lowest-index triangle that hits it.
+    """
+    global _gpu_kernel
+    if _gpu_kernel is None:
+        _gpu_kernel = cupy.RawKernel(_GPU_KERNEL_SOURCE, 'rasterize_pairs', options=('--fmad=false',))
+
+    n = len(triangles)
+    origin = bbox.min_pt
+    cell_min, cell_max = triangle_cell_bounds(triangles, bbox, cell_size, grid_dims)
+    box_dims = np.maximum(cell_max - cell_min + 1, 0)
+    pair_ends = np.cumsum(box_dims.prod(axis=1))
+
+    a = cupy.asarray(triangles.v0)
+    b = cupy.asarray(triangles.v1)
+    c = cupy.asarray(triangles.v2)
+    cell_min_d = cupy.asarray(cell_min)
+    box_dims_d = cupy.asarray(box_dims)
+    owner = cupy.full(grid_dims, np.iinfo(np.int32).max, dtype=cupy.int32)
+
+    threads = 256
+    start = 0
+    while start < n:
+        # Take triangles until the batch holds GPU_BATCH_PAIRS pairs (at least one triangle)
+        first_pair = int(pair_ends[start - 1]) if start else 0
+        stop = max(int(np.searchsorted(pair_ends, first_pair + GPU_BATCH_PAIRS, side='right')), start + 1)
+        n_pairs = int(pair_ends[stop - 1]) - first_pair
+        if n_pairs:
+            offsets = cupy.asarray(np.concatenate(([0], pair_ends[start:stop] - first_pair)))
+            blocks = (n_pairs + threads - 1) // threads
+            _gpu_kernel((blocks,), (threads,), (
+                a[start:stop], b[start:stop], c[start:stop],
+                cell_min_d[start:stop], box_dims_d[start:stop], offsets,
+                np.int32(start), np.int32(stop - start), np.int64(n_pairs),
+                np.float64(origin[0]), np.float64(origin[1]), np.float64(origin[2]),
+                np.float64(cell_size), np.int32(grid_dims[1]), np.int32(grid_dims[2]), owner))
+        start = stop
+
+    values = cupy.asarray(triangles.material + 1)
+    hit = owner < n
+    grid = cupy.where(hit, values[cupy.where(hit, owner, 0)], 0).astype(cupy.uint16)
+    return cupy.asnumpy(grid)
+
+
+def rasterize_triangles(triangles: Triangles, bbox: BoundingBox, cell_size: float,
+                        grid_dims: tuple, use_gpu: bool = False) -> np.ndarray:
+    """
+    Return a dense uint16 grid holding 1 + the palette index of the first triangle
+    touching each cell, or 0 for empty cells. With use_gpu, the cells are tested on
+    the GPU by rasterize_triangles_gpu (see gpu_available).
+    """
+    if use_gpu:
+        return rasterize_triangles_gpu(triangles, bbox, cell_size, grid_dims)
+
+    origin = bbox.min_pt
+    grid = np.zeros(grid_dims, dtype=np.uint16)
+
+    if not HAVE_NUMBA:
+        edges, normals = triangle_edges(triangles)
+        cell_min, cell_max = triangle_cell_bounds(triangles, bbox, cell_size, grid_dims)
+        workers = min(os.cpu_count() or 1, grid_dims[0])
+        if workers > 1 and len(triangles) >= SHARD_MIN_TRIANGLES:
+            _rasterize_sharded(triangles, edges, normals, cell_min, cell_max, origin,
+                               cell_size, grid, workers)
+        else:
+            _rasterize_batched(triangles, edges, normals, cell_min, cell_max, origin, cell_size, grid)
+        return grid
+
+    # Lay triangle data out in Z-order of their centroids so the candidates of
+    # neighboring cells sit close together in memory
+    centroid_cells = ((triangles.v0 + triangles.v1 + triangles.v2) / 3 - origin) / cell_size
+    order = np.argsort(morton_encode(np.maximum(centroid_cells, 0).astype(np.int64)), kind='stable')
+    slots = np.empty(len(order), dtype=np.int32)
+    slots[order] = np.arange(len(order), dtype=np.int32)
+    a, b, c, edges, normals, values, cell_min, cell_max = _prepare_triangles(
+        triangles.v0, triangles.v1, triangles.v2, triangles.material,
+        slots, origin, cell_size, tuple(grid_dims))
+
+    # Index candidate triangles by tile, then fill each tile from its own list.
+    # Lists keep file order, so the lowest-index triangle still wins each cell.
+    tile_dims = tuple(-(-d // TILE_SIZE) for d in grid_dims)
+    tile_spans = np.maximum(cell_max // TILE_SIZE - cell_min // TILE_SIZE + 1, 0)
+    offsets, tri_ids = _bin_triangles(a, normals, cell_min, cell_max, origin, cell_size,
+                                      tile_dims, slots, int(tile_spans.prod(axis=1).sum()))
+
+    _rasterize_tiles(a, b, c, edges, normals, values, cell_min, cell_max,
+                     offsets, tri_ids, origin, cell_size, grid)
+    return grid
+
+
+def grid_cells(grid: np.ndarray, palette: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Return the (N, 3) indices and (N, 3) RGB colors of the occupied cells of a voxel grid."""
+    occupied = np.nonzero(grid)
+    return np.column_stack(occupied), palette[grid[occupied] - 1]
+
+
+def grid_to_voxels(grid: np.ndarray, palette: np.ndarray) -> np.ndarray:
+    """Convert a voxel grid to a voxel array (see voxel_io.VOXEL_DTYPE)."""
+    return cells_to_voxels(*grid_cells(grid, palette))
+
+
+def cells_to_voxels(coords: np.ndarray, rgb: np.ndarray) -> np.ndarray:
+    """Build a voxel array from (N, 3) cell indices and (N, 3) RGB colors."""
+    voxels = np.empty(len(coords), dtype=VOXEL_DTYPE)
+    for axis, name in enumerate('xyz'):
+        voxels[name] = coords[:, axis]
+    for channel, name in enumerate('rgb'):
+        voxels[name] = rgb[:, channel]
+    return voxels
+
+
+def voxelize(triangles: Triangles, bbox: BoundingBox, resolution: int,
+             use_gpu: bool = False) -> Tuple[np.ndarray, tuple]:
+    """
+    Convert triangles to a dense voxel grid of palette indices, offset by one
+    so that 0 marks an empty voxel. use_gpu rasterizes on the GPU.
+    """
     print(f"Voxelizing at resolution {resolution}...")
 
     # Calculate voxel size
-    size = Vec3(
-        bbox.max_pt.x - bbox.min_pt.x,
-        bbox.max_pt.y - bbox.min_pt.y,
-        bbox.max_pt.z - bbox.min_pt.z
-    )
+    size = (bbox.max_pt - bbox.min_pt).tolist()
 
-    max_size = max(size.x, size.y, size.z)
+    max_size = max(size)
     voxel_size = max_size / resolution
 
     # Calculate grid dimensions (maintaining aspect ratio)
-    grid_x = max(1, int(math.ceil(size.x / voxel_size)))
-    grid_y = max(1, int(math.ceil(size.y / voxel_size)))
-    grid_z = max(1, int(math.ceil(size.z / voxel_size)))
+    grid_x, grid_y, grid_z = (max(1, int(math.ceil(s / voxel_size))) for s in size)
 
     print(f"  Grid size: {grid_x} x {grid_y} x {grid_z}")
     print(f"  Voxel size: {voxel_size:.4f}")
 
-    # Voxel storage: key = (x, y, z), value = color
-    voxels = {}
-    half_voxel = voxel_size / 2
-    box_half = Vec3(half_voxel, half_voxel, half_voxel)
-
-    # Process each triangle
-    total = len(triangles)
-    for i, tri in enumerate(triangles):
-        if (i + 1) % 10000 == 0:
-            print(f"  Processing triangle {i + 1}/{total}...")
-
-        # Find bounding box of triangle in voxel coordinates
-        tri_min = Vec3(
-            min(tri.v0.x, tri.v1.x, tri.v2.x),
-            min(tri.v0.y, tri.v1.y, tri.v2.y),
-            min(tri.v0.z, tri.v1.z, tri.v2.z)
-        )
-        tri_max = Vec3(
-            max(tri.v0.x, tri.v1.x, tri.v2.x),
-            max(tri.v0.y, tri.v1.y, tri.v2.y),
-            max(tri.v0.z, tri.v1.z, tri.v2.z)
-        )
-
-        # Convert to voxel indices
-        min_vx = max(0, int((tri_min.x - bbox.min_pt.x) / voxel_size))
-        min_vy = max(0, int((tri_min.y - bbox.min_pt.y) / voxel_size))
-        min_vz = max(0, int((tri_min.z - bbox.min_pt.z) / voxel_size))
-        max_vx = min(grid_x - 1, int((tri_max.x - bbox.min_pt.x) / voxel_size))
-        max_vy = min(grid_y - 1, int((tri_max.y - bbox.min_pt.y) / voxel_size))
-        max_vz = min(grid_z - 1, int((tri_max.z - bbox.min_pt.z) / voxel_size))
-
-        # Check each voxel in the triangle's bounding box
-        for vx in range(min_vx, max_vx + 1):
-            for vy in range(min_vy, max_vy + 1):
-                for vz in range(min_vz, max_vz + 1):
-                    key = (vx, vy, vz)
-                    if key in voxels:
-                        continue
-
-                    # Calculate voxel center in world coordinates
-                    center = Vec3(
-                        bbox.min_pt.x + (vx + 0.5) * voxel_size,
-                        bbox.min_pt.y + (vy + 0.5) * voxel_size,
-                        bbox.min_pt.z + (vz + 0.5) * voxel_size
-                    )
-
-                    # Check if triangle intersects this voxel
-                    if triangle_aabb_intersect(tri, center, box_half):
-                        voxels[key] = tri.color
-
-    # Convert to list format
-    result = []
-    for (vx, vy, vz), (r, g, b) in voxels.items():
-        result.append({
-            'x': vx,
-            'y': vy,
-            'z': vz,
-            'r': r,
-            'g': g,
-            'b': b
-        })
+    # Dense voxel grid of palette indices + 1, 0 = empty
+    grid = rasterize_triangles(triangles, bbox, voxel_size, (grid_x, grid_y, grid_z), use_gpu)
 
-    print(f"  Generated {len(result)} voxels")
-    return result, (grid_x, grid_y, grid_z)
+    print(f"  Generated {np.count_nonzero(grid)} voxels")
+    return grid, (grid_x, grid_y, grid_z)
 
 
-def voxelize_detail(triangles: List[Triangle], bbox: BoundingBox, resolution: int) -> Tuple[List[dict], List[dict], tuple]:
+def voxelize_detail(triangles: Triangles, bbox: BoundingBox, resolution: int,
+                    use_gpu: bool = False) -> Tuple[np.ndarray, List[dict], tuple]:
     """
     Convert triangles to voxels with 4x4x4 sub-voxel detail.
-    Returns (regular_voxels, detail_voxels, grid_size).
+    Returns (regular_voxels, detail_voxels, grid_size), with the regular voxels
+    as a voxel array. use_gpu rasterizes the sub-voxels on the GPU.
     """
     print(f"Voxelizing with detail at base resolution {resolution} (sub-voxels at {resolution * 4})...")
 
     DETAIL_SIZE = 4  # 4x4x4 sub-voxels per voxel
 
-    size = Vec3(
-        bbox.max_pt.x - bbox.min_pt.x,
-        bbox.max_pt.y - bbox.min_pt.y,
-        bbox.max_pt.z - bbox.min_pt.z
-    )
+    size = (bbox.max_pt - bbox.min_pt).tolist()
 
-    max_size = max(size.x, size.y, size.z)
+    max_size = max(size)
     base_voxel_size = max_size / resolution
     sub_voxel_size = base_voxel_size / DETAIL_SIZE
 
-    grid_x = max(1, int(math.ceil(size.x / base_voxel_size)))
-    grid_y = max(1, int(math.ceil(size.y / base_voxel_size)))
-    grid_z = max(1, int(math.ceil(size.z / base_voxel_size)))
+    grid_x, grid_y, grid_z = (max(1, int(math.ceil(s / base_voxel_size))) for s in size)
 
     detail_grid_x = grid_x * DETAIL_SIZE
     detail_grid_y = grid_y * DETAIL_SIZE
@@ -460,93 +1231,48 @@ def voxelize_detail(triangles: List[Triangle], bbox: BoundingBox, resolution: in
     print(f"  Base grid size: {grid_x} x {grid_y} x {grid_z}")
     print(f"  Detail grid size: {detail_grid_x} x {detail_grid_y} x {detail_grid_z}")
 
-    sub_voxels = {}
-    half_sub = sub_voxel_size / 2
-    box_half = Vec3(half_sub, half_sub, half_sub)
-
-    total = len(triangles)
-    for i, tri in enumerate(triangles):
-        if (i + 1) % 10000 == 0:
-            print(f"  Processing triangle {i + 1}/{total}...")
-
-        tri_min = Vec3(
-            min(tri.v0.x, tri.v1.x, tri.v2.x),
-            min(tri.v0.y, tri.v1.y, tri.v2.y),
-            min(tri.v0.z, tri.v1.z, tri.v2.z)
-        )
-        tri_max = Vec3(
-            max(tri.v0.x, tri.v1.x, tri.v2.x),
-            max(tri.v0.y, tri.v1.y, tri.v2.y),
-            max(tri.v0.z, tri.v1.z, tri.v2.z)
-        )
-
-        min_sx = max(0, int((tri_min.x - bbox.min_pt.x) / sub_voxel_size))
-        min_sy = max(0, int((tri_min.y - bbox.min_pt.y) / sub_voxel_size))
-        min_sz = max(0, int((tri_min.z - bbox.min_pt.z) / sub_voxel_size))
-        max_sx = min(detail_grid_x - 1, int((tri_max.x - bbox.min_pt.x) / sub_voxel_size))
-        max_sy = min(detail_grid_y - 1, int((tri_max.y - bbox.min_pt.y) / sub_voxel_size))
-        max_sz = min(detail_grid_z - 1, int((tri_max.z - bbox.min_pt.z) / sub_voxel_size))
-
-        for sx in range(min_sx, max_sx + 1):
-            for sy in range(min_sy, max_sy + 1):
-                for sz in range(min_sz, max_sz + 1):
-                    key = (sx, sy, sz)
-                    if key in sub_voxels:
-                        continue
-
-                    center = Vec3(
-                        bbox.min_pt.x + (sx + 0.5) * sub_voxel_size,
-                        bbox.min_pt.y + (sy + 0.5) * sub_voxel_size,
-                        bbox.min_pt.z + (sz + 0.5) * sub_voxel_size
-                    )
-
-                    if triangle_aabb_intersect(tri, center, box_half):
-                        sub_voxels[key] = tri.color
-
-    print(f"  Generated {len(sub_voxels)} sub-voxels")
-
-    # Group sub-voxels by parent voxel position
-    parent_voxels = {}
-    for (sx, sy, sz), color in sub_voxels.items():
-        vx = sx // DETAIL_SIZE
-        vy = sy // DETAIL_SIZE
-        vz = sz // DETAIL_SIZE
-        sub_x = sx % DETAIL_SIZE
-        sub_y = sy % DETAIL_SIZE
-        sub_z = sz % DETAIL_SIZE
-
-        parent_key = (vx, vy, vz)
-        if parent_key not in parent_voxels:
-            parent_voxels[parent_key] = {}
-        parent_voxels[parent_key][(sub_x, sub_y, sub_z)] = color
-
-    # Separate into regular voxels (fully filled same color) and detail voxels
-    regular_voxels = []
+    sub_grid = rasterize_triangles(triangles, bbox, sub_voxel_size,
+                                   (detail_grid_x, detail_grid_y, detail_grid_z), use_gpu)
+    print(f"  Generated {np.count_nonzero(sub_grid)} sub-voxels")
+
+    # View the sub-voxel grid as (parent x, sub x, parent y, sub y, parent z, sub z)
+    blocks = sub_grid.reshape(grid_x, DETAIL_SIZE, grid_y, DETAIL_SIZE, grid_z, DETAIL_SIZE)
+
+    # Coarse pass: find the occupied parents. The DETAIL_SIZE sub-voxels of a parent
+    # along z are contiguous, so each run is read as one wide integer, testing them
+    # all with a single comparison.
+    runs = sub_grid.view(f'u{DETAIL_SIZE * sub_grid.itemsize}')
+    runs = runs.reshape(grid_x, DETAIL_SIZE, grid_y, DETAIL_SIZE, grid_z)
+    parent_coords = np.argwhere(runs.any(axis=(1, 3)))
+
+    # Fine pass: classify just the occupied parents by their sub-voxels. Palette
+    # colors are distinct, so equal grid values mean equal colors.
+    px, py, pz = parent_coords.T
+    parent_blocks = blocks[px, :, py, :, pz, :]  # (M, sub x, sub y, sub z)
+    first = parent_blocks[:, 0, 0, 0]
+    # Regular voxels are fully filled with one color
+    regular = (first != 0) & (parent_blocks == first[:, None, None, None]).all(axis=(1, 2, 3))
+
+    regular_voxels = cells_to_voxels(parent_coords[regular], triangles.palette[first[regular] - 1])
+
+    # Partial fill or mixed colors - use detail voxels. Sub-voxels of every detail
+    # parent, parents in grid order.
+    detail_coords = parent_coords[~regular]
+    sub_blocks = parent_blocks[~regular]
+    parent_index, sx, sy, sz = np.nonzero(sub_blocks)
+    sub_colors = triangles.palette[sub_blocks[parent_index, sx, sy, sz] - 1]
+    ends = np.cumsum(np.bincount(parent_index, minlength=len(detail_coords))).tolist()
+
+    sub_rows = np.column_stack((sx, sy, sz, sub_colors)).tolist()
     detail_voxels = []
-    TOTAL_SUB_VOXELS = DETAIL_SIZE ** 3
-
-    for (vx, vy, vz), sub_data in parent_voxels.items():
-        if len(sub_data) == TOTAL_SUB_VOXELS:
-            colors = list(sub_data.values())
-            first_color = colors[0]
-            if all(c == first_color for c in colors):
-                regular_voxels.append({
-                    'x': vx, 'y': vy, 'z': vz,
-                    'r': first_color[0], 'g': first_color[1], 'b': first_color[2]
-                })
-                continue
-
-        # Partial fill or mixed colors - use detail voxels
-        sub_list = []
-        for (sub_x, sub_y, sub_z), (r, g, b) in sub_data.items():
-            sub_list.append({
-                'sx': sub_x, 'sy': sub_y, 'sz': sub_z,
-                'r': r, 'g': g, 'b': b
-            })
+    start = 0
+    for (vx, vy, vz), end in zip(detail_coords.tolist(), ends):
         detail_voxels.append({
             'x': vx, 'y': vy, 'z': vz,
-            'subVoxels': sub_list
+            'subVoxels': [{'sx': sub_x, 'sy': sub_y, 'sz': sub_z, 'r': r, 'g': g, 'b': b}
+                          for sub_x, sub_y, sub_z, r, g, b in sub_rows[start:end]]
         })
+        start = end
 
     print(f"  Regular voxels (fully solid): {len(regular_voxels)}")
     print(f"  Detail voxels (with sub-voxels): {len(detail_voxels)}")
@@ -574,6 +1300,8 @@ def main():
                         help='Make model hollow (remove interior voxels)')
     parser.add_argument('--detail', action='store_true',
                         help='Generate detail voxels with 4x4x4 sub-voxels for higher resolution')
+    parser.add_argument('--gpu', action='store_true',
+                        help='Rasterize on a CUDA GPU via CuPy (falls back to the CPU if unavailable)')
 
     args = parser.parse_args()
 
@@ -589,7 +1317,7 @@ def main():
     # Parse OBJ
     triangles, bbox = parse_obj(args.input, args.exclude, args.include_objects)
 
-    if not triangles:
+    if len(triangles) == 0:
         print("Error: No triangles found in OBJ file")
         sys.exit(1)
 
@@ -599,48 +1327,41 @@ def main():
         cos_a = math.cos(angle_rad)
         sin_a = math.sin(angle_rad)
         print(f"Rotating {args.rotate_y} degrees around Y axis...")
-        rotated_triangles = []
-        for tri in triangles:
-            def rotate_y(v):
-                return Vec3(
-                    v.x * cos_a + v.z * sin_a,
-                    v.y,
-                    -v.x * sin_a + v.z * cos_a
-                )
-            rotated_triangles.append(Triangle(
-                rotate_y(tri.v0), rotate_y(tri.v1), rotate_y(tri.v2), tri.color
-            ))
-        triangles = rotated_triangles
-        # Recalculate bounding box after rotation
-        all_verts = []
-        for tri in triangles:
-            all_verts.extend([tri.v0, tri.v1, tri.v2])
-        bbox = BoundingBox(
-            Vec3(min(v.x for v in all_verts), min(v.y for v in all_verts), min(v.z for v in all_verts)),
-            Vec3(max(v.x for v in all_verts), max(v.y for v in all_verts), max(v.z for v in all_verts))
-        )
+
+        rotation = np.array([
+            [cos_a, 0.0, sin_a],
+            [0.0, 1.0, 0.0],
+            [-sin_a, 0.0, cos_a]
+        ])
+        # Rotate all corners in one (3, N, 3) @ (3, 3) product
+        corners = np.stack([triangles.v0, triangles.v1, triangles.v2]) @ rotation.T
+        v0, v1, v2 = corners
+        triangles = Triangles(v0, v1, v2, triangles.material, triangles.palette)
+        # Recalculate bounding box after rotation, reducing all corners at once
+        bbox = bounding_box(corners.reshape(-1, 3))
+
+    use_gpu = args.gpu and gpu_available()
+    if args.gpu and not use_gpu:
+        print("Warning: --gpu needs CuPy and a CUDA device; rasterizing on the CPU")
 
     # Voxelize (with or without detail)
     if args.detail:
-        regular_voxels, detail_voxels, grid_size = voxelize_detail(triangles, bbox, args.resolution)
+        regular_voxels, detail_voxels, grid_size = voxelize_detail(triangles, bbox, args.resolution, use_gpu)
         voxels = regular_voxels
     else:
-        voxels, grid_size = voxelize(triangles, bbox, args.resolution)
+        grid, grid_size = voxelize(triangles, bbox, args.resolution, use_gpu)
         detail_voxels = []
 
-    # Hollow out interior if requested (only for non-detail mode)
-    if args.hollow and not args.detail:
-        voxel_dict = {(v['x'], v['y'], v['z']): (v['r'], v['g'], v['b']) for v in voxels}
-        voxel_dict = hollow_out(voxel_dict, grid_size)
-        voxels = [{'x': x, 'y': y, 'z': z, 'r': r, 'g': g, 'b': b}
-                  for (x, y, z), (r, g, b) in voxel_dict.items()]
+        # Hollow out interior if requested (only for non-detail mode)
+        if args.hollow:
+            grid = hollow_out(grid)
+        voxels = grid_to_voxels(grid, triangles.palette)
 
     # Override color if requested
     if args.color:
         r, g, b = [int(c) for c in args.color.split(',')]
         print(f"Overriding color to RGB({r}, {g}, {b})")
-        for v in voxels:
-            v['r'], v['g'], v['b'] = r, g, b
+        voxels['r'], voxels['g'], voxels['b'] = r, g, b
         for dv in detail_voxels:
             for sv in dv['subVoxels']:
                 sv['r'], sv['g'], sv['b'] = r, g, b
@@ -660,12 +1381,10 @@ def main():
         output_data['detailVoxelCount'] = len(detail_voxels)
         output_data['detailVoxels'] = detail_voxels
 
-    if args.compact:
-        # Compact format: [[x, y, z, r, g, b], ...]
-        output_data['voxels'] = [[v['x'], v['y'], v['z'], v['r'], v['g'], v['b']] for v in voxels]
-
-    with open(output_path, 'w') as f:
-        json.dump(output_data, f, indent=2 if not args.compact else None)
+    # Voxels stay an array until save_model writes them as dicts, or as
+    # [[x, y, z, r, g, b], ...] rows in compact mode.
+    # Written without indentation (orjson when available); the game doesn't need it pretty-printed
+    save_model(output_path, output_data, compact=args.compact)
 
     file_size = os.path.getsize(output_path)
     print(f"Done! Output: {output_path} ({file_size / 1024:.1f} KB)")